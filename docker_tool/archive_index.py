@@ -0,0 +1,310 @@
+import bisect
+import json
+import os
+import sys
+import tarfile
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+INDEX_VERSION = 1
+INDEX_KEYS = ("compression", "checkpoints", "members", "layers", "manifest")
+GZIP_MAGIC = b"\x1f\x8b"
+READ_BLOCK_SIZE = 256 * 1024
+OUTPUT_BLOCK_SIZE = 1024 * 1024
+
+class GzipMemberReader:
+    """顺序解压（可能由多个成员拼接的）gzip流
+
+    每个gzip成员的起点都可以独立解压，读取时把 (压缩偏移, 解压偏移) 记录为检查点，
+    之后可以从最近的检查点开始解压，跳过前面的成员。单个成员内部没有检查点，只能从成员开头顺序解压。
+    """
+
+    def __init__(self, fileobj, compressed_offset: Optional[int] = None, uncompressed_offset: int = 0,
+                 checkpoints: Optional[List[Tuple[int, int]]] = None):
+        self._f = fileobj
+        if compressed_offset is not None:
+            fileobj.seek(compressed_offset)
+        self._fed = compressed_offset or 0
+        self._pos = uncompressed_offset
+        self._d = zlib.decompressobj(31)
+        self._input = b""
+        self._pending = b""
+        self._eof = False
+        self.checkpoints = checkpoints
+        if checkpoints is not None:
+            checkpoints.append((self._fed, self._pos))
+
+    def _read_input(self) -> bytes:
+        data = self._f.read(READ_BLOCK_SIZE)
+        self._fed += len(data)
+        return data
+
+    def _fill(self):
+        while not self._pending and not self._eof:
+            if self._d.eof:
+                # 当前成员结束，剩余数据是下一个成员的开头
+                leftover = self._d.unused_data or self._read_input()
+                if not leftover or not leftover.startswith(GZIP_MAGIC[:len(leftover)]):
+                    self._eof = True
+                    break
+                member_start = self._fed - len(leftover)
+                self._d = zlib.decompressobj(31)
+                self._input = leftover
+                if self.checkpoints is not None:
+                    self.checkpoints.append((member_start, self._pos))
+
+            if not self._input:
+                self._input = self._read_input()
+                if not self._input:
+                    raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+
+            self._pending = self._d.decompress(self._input, OUTPUT_BLOCK_SIZE)
+            self._input = self._d.unconsumed_tail
+
+    def read(self, size: int = -1) -> bytes:
+        chunks = []
+        while size < 0 or size > 0:
+            self._fill()
+            if not self._pending:
+                break
+            chunk = self._pending if size < 0 else self._pending[:size]
+            self._pending = self._pending[len(chunk):]
+            self._pos += len(chunk)
+            chunks.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b"".join(chunks)
+
+    def skip(self, size: int):
+        """丢弃size字节的解压数据"""
+        while size > 0:
+            chunk = self.read(min(size, OUTPUT_BLOCK_SIZE))
+            if not chunk:
+                raise EOFError("Unexpected end of compressed data")
+            size -= len(chunk)
+
+class _LimitedReader:
+    """只读取底层流接下来size字节的视图"""
+
+    def __init__(self, fileobj, size: int):
+        self._f = fileobj
+        self._remaining = size
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._f.read(size)
+        self._remaining -= len(data)
+        return data
+
+class _PrefixedReader:
+    """在底层流前拼接已预读的数据"""
+
+    def __init__(self, prefix: bytes, fileobj):
+        self._prefix = prefix
+        self._f = fileobj
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            data, self._prefix = self._prefix + self._f.read(), b""
+            return data
+        if self._prefix:
+            data, self._prefix = self._prefix[:size], self._prefix[size:]
+            return data
+        return self._f.read(size)
+
+def _normalize_path(path: str) -> str:
+    """统一层内文件路径格式，去掉开头的 ./ 和 /"""
+    while path.startswith("./"):
+        path = path[2:]
+    return path.lstrip("/")
+
+def _index_layer(fileobj) -> Optional[Dict]:
+    """顺序读取一个层并记录其中每个文件在解压后层数据中的偏移，不是tar时返回None"""
+    head = fileobj.read(512)
+    compression = "gzip" if head.startswith(GZIP_MAGIC) else "none"
+    stream = _PrefixedReader(head, fileobj)
+    if compression == "gzip":
+        stream = GzipMemberReader(stream)
+
+    files = []
+    try:
+        with tarfile.open(fileobj=stream, mode="r|") as tar:
+            for member in tar:
+                files.append([_normalize_path(member.name), member.offset_data, member.size,
+                              member.mode, member.type.decode("ascii")])
+    except (tarfile.TarError, EOFError, zlib.error):
+        return None
+
+    return {"compression": compression, "files": files}
+
+class ArchiveIndex:
+    """镜像TAR文件的持久化索引
+
+    记录外层TAR中每个文件的偏移、每个层中每个文件的偏移，以及外层gzip的检查点。
+    索引保存在 <archive>.index.json，归档文件大小或修改时间变化时自动重建。
+    """
+
+    def __init__(self, archive_path: str, data: Dict):
+        self.archive_path = archive_path
+        self.data = data
+        self._checkpoint_offsets = [uncompressed for _, uncompressed in data["checkpoints"]]
+
+    @staticmethod
+    def _fingerprint(archive_path: str) -> Dict:
+        stat = os.stat(archive_path)
+        return {"archive_size": stat.st_size, "archive_mtime_ns": stat.st_mtime_ns}
+
+    @classmethod
+    def build(cls, archive_path: str) -> "ArchiveIndex":
+        """顺序扫描一遍归档文件建立索引"""
+        data = {"version": INDEX_VERSION, **cls._fingerprint(archive_path)}
+        checkpoints = []
+        members = {}
+        layers = {}
+        manifest = []
+
+        with open(archive_path, "rb") as f:
+            compressed = f.read(2) == GZIP_MAGIC
+            f.seek(0)
+            stream = GzipMemberReader(f, compressed_offset=0, checkpoints=checkpoints) if compressed else f
+
+            with tarfile.open(fileobj=stream, mode="r|") as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    members[member.name] = {"offset": member.offset_data, "size": member.size}
+
+                    if member.name == "manifest.json":
+                        manifest = json.load(tar.extractfile(member))
+                    elif not member.name.endswith(".json"):
+                        layer = _index_layer(tar.extractfile(member))
+                        if layer is not None:
+                            layers[member.name] = layer
+
+        data.update({
+            "compression": "gzip" if compressed else "none",
+            "checkpoints": checkpoints,
+            "members": members,
+            "layers": layers,
+            "manifest": manifest,
+        })
+        return cls(archive_path, data)
+
+    @classmethod
+    def load_or_build(cls, archive_path: str, index_path: Optional[str] = None,
+                      rebuild: bool = False) -> "ArchiveIndex":
+        """读取已有索引，不存在、已过期或已损坏时重建并保存
+
+        索引先写入临时文件再替换，中断不会留下不完整的索引；无法保存时（例如目录只读）仍返回内存中的索引。
+        """
+        index_path = index_path or archive_path + ".index.json"
+
+        if not rebuild and os.path.exists(index_path):
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                fingerprint = cls._fingerprint(archive_path)
+                if data.get("version") == INDEX_VERSION and all(data.get(k) == v for k, v in fingerprint.items()) \
+                        and all(k in data for k in INDEX_KEYS):
+                    return cls(archive_path, data)
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                print(f"Ignoring unreadable index {index_path}: {e}", file=sys.stderr)
+
+        index = cls.build(archive_path)
+        tmp_path = index_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index.data, f)
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            print(f"Could not save index to {index_path}: {e}", file=sys.stderr)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return index
+
+    def layers(self) -> List[str]:
+        """按manifest中从底到顶的顺序返回层名称"""
+        manifest = self.data["manifest"]
+        ordered = manifest[0]["Layers"] if manifest else []
+        return [name for name in ordered if name in self.data["layers"]] + \
+               sorted(name for name in self.data["layers"] if name not in ordered)
+
+    def resolve_layer(self, name: str) -> str:
+        """按完整名称或唯一前缀查找层，未找到时抛出KeyError，前缀不唯一时抛出ValueError"""
+        if name in self.data["layers"]:
+            return name
+        matches = [layer for layer in self.layers() if layer.startswith(name)]
+        if not matches:
+            raise KeyError(f"Unknown layer: {name}")
+        if len(matches) > 1:
+            raise ValueError(f"Ambiguous layer prefix {name}: matches {', '.join(matches)}")
+        return matches[0]
+
+    def list_files(self, layer: Optional[str] = None) -> Iterator[Tuple[str, str, int]]:
+        """列出 (层, 路径, 大小)，layer可以是层名称的唯一前缀"""
+        for name in ([self.resolve_layer(layer)] if layer else self.layers()):
+            for path, _, size, _, _ in self.data["layers"][name]["files"]:
+                yield name, path, size
+
+    def find(self, path: str) -> List[str]:
+        """返回包含该路径的所有层（从底到顶）"""
+        path = _normalize_path(path)
+        return [name for name in self.layers()
+                if any(entry[0] == path for entry in self.data["layers"][name]["files"])]
+
+    def _open_at(self, f, offset: int):
+        """返回定位到外层解压数据offset处的读取器"""
+        if self.data["compression"] != "gzip":
+            f.seek(offset)
+            return f
+
+        # 从offset之前最近的gzip检查点开始解压
+        i = bisect.bisect_right(self._checkpoint_offsets, offset) - 1
+        compressed_offset, uncompressed_offset = self.data["checkpoints"][i]
+        reader = GzipMemberReader(f, compressed_offset=compressed_offset, uncompressed_offset=uncompressed_offset)
+        reader.skip(offset - uncompressed_offset)
+        return reader
+
+    def read_member(self, name: str) -> bytes:
+        """读取外层TAR中的单个文件"""
+        member = self.data["members"][name]
+        with open(self.archive_path, "rb") as f:
+            return self._open_at(f, member["offset"]).read(member["size"])
+
+    def read_file(self, path: str, layer: Optional[str] = None) -> bytes:
+        """读取某层中的单个文件，未指定层时使用包含该文件的最上层，layer可以是层名称的唯一前缀"""
+        path = _normalize_path(path)
+        if layer is None:
+            containing = self.find(path)
+            if not containing:
+                raise FileNotFoundError(f"File not found in any layer: {path}")
+            layer = containing[-1]
+        else:
+            layer = self.resolve_layer(layer)
+
+        entry = next((e for e in self.data["layers"][layer]["files"] if e[0] == path), None)
+        if entry is None:
+            raise FileNotFoundError(f"File not found in layer {layer}: {path}")
+        _, offset, size, _, member_type = entry
+        if member_type != tarfile.REGTYPE.decode("ascii") and member_type != tarfile.AREGTYPE.decode("ascii"):
+            raise ValueError(f"Not a regular file: {path}")
+
+        member = self.data["members"][layer]
+        with open(self.archive_path, "rb") as f:
+            stream = _LimitedReader(self._open_at(f, member["offset"]), member["size"])
+            if self.data["layers"][layer]["compression"] == "gzip":
+                # 层通常是单个gzip成员，需要从层的开头解压到目标文件
+                stream = GzipMemberReader(stream)
+                stream.skip(offset)
+            else:
+                _skip(stream, offset)
+            return stream.read(size)
+
+def _skip(fileobj, size: int):
+    """在不支持seek的流上向前跳过size字节"""
+    while size > 0:
+        chunk = fileobj.read(min(size, OUTPUT_BLOCK_SIZE))
+        if not chunk:
+            raise EOFError("Unexpected end of layer data")
+        size -= len(chunk)
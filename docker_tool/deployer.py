@@ -1,13 +1,39 @@
-from typing import Optional, Dict
+import shlex
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Tuple
 from .ssh_client import SSHClient
 
+# 压缩格式对应的远程并行解压命令
+DECOMPRESSORS = {
+    ".gz": ("pigz", "pigz -dc"),
+    ".zst": ("zstd", "zstd -dc -T0"),
+}
+
 class DockerDeployer:
     def __init__(self, ssh_client: SSHClient):
         self.ssh_client = ssh_client
+        self._available_tools: Optional[Dict[str, bool]] = None
+    
+    def detect_decompressors(self) -> Dict[str, bool]:
+        """检测远程服务器上可用的并行解压工具（结果会缓存）"""
+        if self._available_tools is None:
+            self._available_tools = {}
+            for tool, _ in DECOMPRESSORS.values():
+                exit_status, _, _ = self.ssh_client.execute_command(f"command -v {tool}")
+                self._available_tools[tool] = exit_status == 0
+        return self._available_tools
+    
+    def _load_command(self, remote_image_path: str) -> str:
+        """生成加载命令：有并行解压工具时通过管道解压后交给docker load"""
+        quoted_path = shlex.quote(remote_image_path)
+        for suffix, (tool, decompress) in DECOMPRESSORS.items():
+            if remote_image_path.endswith(suffix) and self.detect_decompressors().get(tool):
+                return f"{decompress} {quoted_path} | docker load"
+        return f"docker load -i {quoted_path}"
     
     def load_image(self, remote_image_path: str) -> bool:
         """在远程服务器上加载Docker镜像"""
-        command = f"docker load -i {remote_image_path}"
+        command = self._load_command(remote_image_path)
         exit_status, stdout, stderr = self.ssh_client.execute_command(command)
         
         if exit_status == 0:
@@ -107,6 +133,42 @@ class DockerDeployer:
         
         return True
     
+    def load_images(self, remote_image_paths: List[str], max_parallel: int = 4) -> Dict[str, bool]:
+        """在远程服务器上并发加载多个镜像，同时进行的docker load不超过max_parallel个"""
+        # 先检测解压工具，避免各线程重复检测
+        self.detect_decompressors()
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as executor:
+            results = list(executor.map(self.load_image, remote_image_paths))
+        
+        return dict(zip(remote_image_paths, results))
+    
+    def deploy_images(self, images: List[Tuple[str, str]], max_parallel: int = 4,
+                      run_container: bool = False) -> bool:
+        """批量部署：并发加载 (远程镜像路径, 镜像名称) 列表中的镜像 -> 可选运行容器 -> 清理临时文件"""
+        # 1. 跳过已存在的镜像
+        to_load = []
+        for remote_image_path, image_name in images:
+            if self.check_image_exists(image_name):
+                print(f"Image {image_name} already exists on the server, skipping load.")
+            else:
+                to_load.append(remote_image_path)
+        
+        # 2. 并发加载镜像
+        results = self.load_images(to_load, max_parallel)
+        success = all(results.values())
+        
+        # 3. 可选运行容器
+        for remote_image_path, image_name in images:
+            if run_container and results.get(remote_image_path, True):
+                success = self.run_container(image_name) and success
+        
+        # 4. 清理临时文件
+        for remote_image_path, _ in images:
+            self.remove_remote_image_file(remote_image_path)
+        
+        return success
+    
     def get_docker_info(self) -> Dict:
         """获取Docker信息"""
         command = "docker info --format '{{json .}}'"
@@ -2,14 +2,75 @@ import tarfile
 import json
 import os
 import shutil
-from typing import Dict, List
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
 from tqdm import tqdm
+from .parallel_gzip import ParallelGzipWriter, DEFAULT_BLOCK_SIZE
+
+class DiskUsageTracker:
+    """采样一组文件的总大小，记录峰值磁盘占用"""
 
-class DockerImagePacker:
     def __init__(self):
-        pass
+        self.peak = 0
+
+    def sample(self, *paths: str) -> int:
+        usage = 0
+        for path in paths:
+            try:
+                usage += os.path.getsize(path)
+            except OSError:
+                # 文件不存在，或在采样时刚被删除
+                pass
+        self.peak = max(self.peak, usage)
+        return usage
+
+    @contextmanager
+    def watching(self, *paths: str, interval: float = 0.1):
+        """在with块执行期间于后台定期采样，捕获只短暂存在的临时文件"""
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.sample(*paths)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            stop.set()
+            thread.join()
+            self.sample(*paths)
+
+
+class DockerImagePacker:
+    def __init__(self, compress_workers: Optional[int] = None, block_size: int = DEFAULT_BLOCK_SIZE):
+        # 并行压缩线程数，默认使用全部CPU核心
+        self.compress_workers = compress_workers
+        self.block_size = block_size
+    
+    def _output_tar_path(self, image_name: str, output_dir: str) -> str:
+        """生成输出TAR文件路径"""
+        output_filename = f"{image_name.replace('/', '_').replace(':', '_')}.tar.gz"
+        return os.path.join(output_dir, output_filename)
+    
+    def _add_docker_manifest(self, tar: tarfile.TarFile, config_name: str,
+                             layer_hashes: List[str], repo_tags: Optional[List[str]] = None):
+        """创建并写入Docker格式的manifest.json"""
+        docker_manifest = [{
+            "Config": config_name,
+            "RepoTags": repo_tags or [],
+            "Layers": [f"{h}.tar.gz" for h in layer_hashes]
+        }]
+        
+        manifest_content = json.dumps(docker_manifest, indent=2).encode("utf-8")
+        manifest_info = tarfile.TarInfo(name="manifest.json")
+        manifest_info.size = len(manifest_content)
+        tar.addfile(manifest_info, fileobj=BytesIO(manifest_content))
     
-    def create_docker_tar(self, image_dir: str, output_tar_path: str) -> str:
+    def create_docker_tar(self, image_dir: str, output_tar_path: str,
+                          repo_tags: Optional[List[str]] = None) -> str:
         """将拉取的镜像文件打包为标准Docker TAR文件"""
         # 检查必要文件是否存在
         manifest_path = os.path.join(image_dir, "manifest.json")
@@ -36,7 +97,8 @@ class DockerImagePacker:
         config_hash = config_digest.split(":")[1]
         
         # 准备Docker TAR结构
-        with tarfile.open(output_tar_path, "w:gz") as tar:
+        gz = ParallelGzipWriter(output_tar_path, workers=self.compress_workers, block_size=self.block_size)
+        with gz, tarfile.open(fileobj=gz, mode="w") as tar:
             # 1. 写入配置文件
             config_name = f"{config_hash}.json"
             tar.add(config_path, arcname=config_name)
@@ -57,18 +119,9 @@ class DockerImagePacker:
                     raise FileNotFoundError(f"Layer file not found: {layer_path}")
             
             # 3. 创建并写入manifest.json
-            docker_manifest = [{
-                "Config": config_name,
-                "RepoTags": [],  # 后续可以从image name中解析添加
-                "Layers": [f"{h}.tar.gz" for h in layer_hashes]
-            }]
-            
-            # 写入manifest.json
-            manifest_content = json.dumps(docker_manifest, indent=2).encode("utf-8")
-            manifest_info = tarfile.TarInfo(name="manifest.json")
-            manifest_info.size = len(manifest_content)
-            tar.addfile(manifest_info, fileobj=BytesIO(manifest_content))
+            self._add_docker_manifest(tar, config_name, layer_hashes, repo_tags)
         
+        print(gz.summary())
         return output_tar_path
     
     def pack_image(self, image_name: str, image_dir: str, output_dir: str) -> str:
@@ -76,46 +129,65 @@ class DockerImagePacker:
         # 创建输出目录
         os.makedirs(output_dir, exist_ok=True)
         
-        # 生成输出文件名
-        output_filename = f"{image_name.replace('/', '_').replace(':', '_')}.tar.gz"
-        output_tar_path = os.path.join(output_dir, output_filename)
+        # 直接在manifest中写入RepoTags，无需解压后重新打包
+        output_tar_path = self._output_tar_path(image_name, output_dir)
+        return self.create_docker_tar(image_dir, output_tar_path, repo_tags=[image_name])
+    
+    def pull_and_pack(self, client, image_name: str, output_dir: str) -> str:
+        """边拉取边打包：每层下载后立即追加到TAR并删除，额外磁盘占用约为一个镜像大小
         
-        # 先创建基本TAR
-        self.create_docker_tar(image_dir, output_tar_path)
+        打包过程中写入隐藏的.partial文件，全部成功后才改名为最终文件，失败时删除。
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        output_tar_path = self._output_tar_path(image_name, output_dir)
+        partial_path = os.path.join(output_dir, f".{os.path.basename(output_tar_path)}.partial")
         
-        # 临时目录用于修改manifest
-        temp_dir = os.path.join(output_dir, "temp")
+        # 临时目录只保存当前正在处理的层
+        temp_dir = os.path.join(output_dir, f".{os.path.basename(output_tar_path)}.layers")
         os.makedirs(temp_dir, exist_ok=True)
         
+        tracker = DiskUsageTracker()
+        manifest = client.get_manifest(image_name)
+        
         try:
-            # 解压TAR到临时目录
-            with tarfile.open(output_tar_path, "r:gz") as tar:
-                tar.extractall(temp_dir)
-            
-            # 修改manifest.json，添加RepoTags
-            manifest_path = os.path.join(temp_dir, "manifest.json")
-            with open(manifest_path, "r") as f:
-                manifest = json.load(f)
-            
-            # 添加RepoTags
-            if isinstance(manifest, list) and manifest:
-                manifest[0]["RepoTags"] = [image_name]
-            
-            # 写回manifest.json
-            with open(manifest_path, "w") as f:
-                json.dump(manifest, f, indent=2)
-            
-            # 重新打包TAR
-            os.remove(output_tar_path)
-            with tarfile.open(output_tar_path, "w:gz") as tar:
-                for root, dirs, files in os.walk(temp_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, temp_dir)
-                        tar.add(file_path, arcname=arcname)
+            gz = ParallelGzipWriter(partial_path, workers=self.compress_workers, block_size=self.block_size)
+            with gz, tarfile.open(fileobj=gz, mode="w") as tar:
+                # 1. 写入配置文件
+                config_hash = manifest["config"]["digest"].split(":")[1]
+                config_name = f"{config_hash}.json"
+                config_path = os.path.join(temp_dir, config_name)
+                client.pull_layer(image_name, manifest["config"]["digest"], config_path)
+                tar.add(config_path, arcname=config_name)
+                os.remove(config_path)
+                
+                # 2. 逐层下载、追加、删除
+                layer_hashes = []
+                for layer in manifest.get("layers", []):
+                    layer_hash = layer["digest"].split(":")[1]
+                    layer_hashes.append(layer_hash)
+                    
+                    layer_filename = f"{layer_hash}.tar.gz"
+                    layer_path = os.path.join(temp_dir, layer_filename)
+                    # 对冲下载时registry客户端会临时写入 <layer>.hedge，也计入磁盘占用
+                    with tracker.watching(partial_path, layer_path, layer_path + ".hedge"):
+                        client.pull_layer(image_name, layer["digest"], layer_path)
+                    
+                    tar.add(layer_path, arcname=layer_filename)
+                    tracker.sample(partial_path, layer_path)
+                    os.remove(layer_path)
+                
+                # 3. 创建并写入manifest.json
+                self._add_docker_manifest(tar, config_name, layer_hashes, [image_name])
+            os.replace(partial_path, output_tar_path)
         finally:
-            # 清理临时目录
-            shutil.rmtree(temp_dir)
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        
+        archive_size = tracker.sample(output_tar_path)
+        print(gz.summary())
+        print(f"Peak disk usage: {tracker.peak / 1024 / 1024:.1f} MB "
+              f"(final archive: {archive_size / 1024 / 1024:.1f} MB)")
         
         return output_tar_path
     
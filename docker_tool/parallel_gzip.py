@@ -0,0 +1,108 @@
+import os
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+# 每个独立gzip块的未压缩大小
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+
+def _compress_block(data: bytes, level: int) -> bytes:
+    """把一个数据块压缩为独立的gzip成员（zlib压缩时会释放GIL）"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+class ParallelGzipWriter:
+    """多线程gzip写入器
+
+    与pigz类似，把输入切成固定大小的块，各块在线程池中独立压缩为gzip成员后按顺序拼接。
+    多成员拼接的文件符合gzip标准，gzip/tarfile/docker load都可以直接读取。
+    """
+
+    def __init__(self, path: str, workers: Optional[int] = None,
+                 level: int = 6, block_size: int = DEFAULT_BLOCK_SIZE):
+        self.path = path
+        self.workers = workers or os.cpu_count() or 1
+        self.level = level
+        self.block_size = block_size
+
+        self._file = open(path, "wb")
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._pending = deque()
+        self._buffer = bytearray()
+        self._closed = False
+
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # 只累计write/close中花费的时间，调用方在两次写入之间做的其他事（例如下载）不计入
+        self.elapsed = 0.0
+
+    def __enter__(self) -> "ParallelGzipWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, data: bytes) -> int:
+        """写入未压缩数据"""
+        start = time.time()
+        self._buffer += data
+        self.bytes_in += len(data)
+
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+
+        self.elapsed += time.time() - start
+        return len(data)
+
+    def tell(self) -> int:
+        """返回已写入的未压缩字节数（tarfile需要）"""
+        return self.bytes_in
+
+    def flush(self):
+        pass
+
+    def _submit(self, block: bytes):
+        self._pending.append(self._executor.submit(_compress_block, block, self.level))
+        # 限制在途块数，避免压缩跟不上时内存无限增长
+        while len(self._pending) > self.workers * 2:
+            self._write_oldest()
+
+    def _write_oldest(self):
+        compressed = self._pending.popleft().result()
+        self._file.write(compressed)
+        self.bytes_out += len(compressed)
+
+    def close(self):
+        """压缩剩余数据并关闭文件"""
+        if self._closed:
+            return
+        self._closed = True
+
+        start = time.time()
+        try:
+            # 空输入也要输出一个合法的gzip成员
+            if self._buffer or self.bytes_in == 0:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self._write_oldest()
+        finally:
+            self._executor.shutdown(wait=True)
+            self._file.close()
+            self.elapsed += time.time() - start
+
+    @property
+    def throughput(self) -> float:
+        """压缩吞吐量（未压缩MB/s），按压缩和写入实际花费的时间计算"""
+        return self.bytes_in / 1024 / 1024 / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        """压缩统计信息"""
+        ratio = self.bytes_out / self.bytes_in if self.bytes_in else 0.0
+        return (f"Compressed {self.bytes_in / 1024 / 1024:.1f} MB -> {self.bytes_out / 1024 / 1024:.1f} MB "
+                f"({ratio:.1%}) in {self.elapsed:.2f}s, {self.throughput:.1f} MB/s with {self.workers} workers")
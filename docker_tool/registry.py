@@ -1,30 +1,137 @@
 import requests
 import json
 import os
+import re
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from typing import Dict, List, Optional, Tuple
 from tqdm import tqdm
 
+# 评分的指数滑动平均系数
+SCORE_ALPHA = 0.3
+DOWNLOAD_CHUNK_SIZE = 16 * 1024
+
+class StallError(IOError):
+    """下载吞吐量持续低于阈值"""
+
+class IncompleteDownloadError(IOError):
+    """连接在blob传输完成前被关闭"""
+
+class ThroughputMonitor:
+    """统计最近window秒内的平均下载速度"""
+
+    def __init__(self, window: float):
+        self.window = window
+        self.start = time.time()
+        self.samples = deque([(self.start, 0)])
+        self.total = 0
+
+    def update(self, num_bytes: int) -> Optional[float]:
+        """记录新收到的字节数，开始下载不足一个窗口时返回None"""
+        now = time.time()
+        self.total += num_bytes
+        self.samples.append((now, self.total))
+        while len(self.samples) > 2 and now - self.samples[1][0] >= self.window:
+            self.samples.popleft()
+        
+        if now - self.start < self.window:
+            return None
+        oldest_time, oldest_total = self.samples[0]
+        return (self.total - oldest_total) / max(now - oldest_time, 1e-6)
+
+class EndpointStats:
+    """单个Registry端点（上游或镜像源）的延迟与吞吐量评分"""
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.throughput: Optional[float] = None
+        self.failures = 0
+
+    @staticmethod
+    def _ewma(old: Optional[float], new: float) -> float:
+        return new if old is None else SCORE_ALPHA * new + (1 - SCORE_ALPHA) * old
+
+    def record_latency(self, seconds: float):
+        self.latency = self._ewma(self.latency, seconds)
+
+    def record_throughput(self, num_bytes: int, seconds: float):
+        self.throughput = self._ewma(self.throughput, num_bytes / max(seconds, 1e-6))
+
+    def record_failure(self):
+        self.failures += 1
+
+def _http_status(error: BaseException) -> Optional[int]:
+    """返回HTTPError对应的状态码，其他错误返回None"""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code
+    return None
+
+def _is_retryable(error: BaseException) -> bool:
+    """连接错误、超时、卡顿、传输中断和5xx可以在同一端点上重试，4xx等其他错误直接换端点"""
+    status = _http_status(error)
+    if status is not None:
+        return status >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                              StallError, IncompleteDownloadError))
+
+def parse_mirror_specs(specs: List[str]) -> Dict[str, List[str]]:
+    """解析 "上游registry=镜像源" 形式的配置，如
+    registry-1.docker.io=swr.cn-north-4.myhuaweicloud.com/ddn-k8s/docker.io
+    """
+    mirrors: Dict[str, List[str]] = {}
+    for spec in specs:
+        if "=" not in spec:
+            raise ValueError(f"Invalid mirror spec (expected REGISTRY=MIRROR): {spec}")
+        registry, mirror = spec.split("=", 1)
+        mirrors.setdefault(registry.strip(), []).append(mirror.strip().rstrip("/"))
+    return mirrors
+
 class DockerRegistryClient:
-    def __init__(self, registry_url: str = "registry-1.docker.io"):
+    def __init__(self, registry_url: str = "registry-1.docker.io",
+                 mirrors: Optional[Dict[str, List[str]]] = None,
+                 connect_timeout: float = 10, read_timeout: float = 60,
+                 max_retries: int = 4, backoff_factor: float = 1.0,
+                 stall_speed: float = 16 * 1024, stall_window: float = 20,
+                 hedge_speed: float = 256 * 1024, hedge_min_bytes: int = 4 * 1024 * 1024):
         self.registry_url = registry_url
         self.base_url = f"https://{registry_url}/v2"
         self.session = requests.Session()
         self.session.headers.update({
             "Accept": "application/vnd.docker.distribution.manifest.v2+json,application/vnd.docker.distribution.manifest.list.v2+json"
         })
+        # 上游registry -> 镜像源列表，镜像源格式为 host[/路径前缀]
+        self.mirrors = mirrors or {}
+        self.endpoint_stats: Dict[str, EndpointStats] = {}
+        self._tokens: Dict[Tuple[str, str], Optional[str]] = {}
+        self._lock = threading.Lock()
         
+        # 连接/读取超时（秒）以及失败后的指数退避重试
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        # stall_window秒内平均速度低于stall_speed（字节/秒）视为卡住，中止后断点续传；
+        # 低于hedge_speed且剩余不少于hedge_min_bytes时，对剩余部分发起对冲请求
+        self.stall_speed = stall_speed
+        self.stall_window = stall_window
+        self.hedge_speed = hedge_speed
+        self.hedge_min_bytes = hedge_min_bytes
+    
     def _get_auth_token(self, registry: str, repository: str, scope: str = "pull") -> Optional[str]:
         """获取认证Token"""
         # 首先尝试直接访问registry获取认证信息
         test_url = f"https://{registry}/v2/{repository}/manifests/latest"
-        response = self.session.get(test_url, allow_redirects=False)
+        response = self.session.get(test_url, allow_redirects=False, timeout=self.timeout)
         
         # 处理401响应，获取认证地址
         if response.status_code == 401:
             auth_header = response.headers.get("WWW-Authenticate", "")
             if "Bearer" in auth_header:
                 # 解析认证地址和service
-                import re
                 realm_match = re.search(r"realm=\"([^\"]+)\"", auth_header)
                 service_match = re.search(r"service=\"([^\"]+)\"", auth_header)
                 
@@ -38,11 +145,19 @@ class DockerRegistryClient:
                         "scope": f"repository:{repository}:{scope}"
                     }
                     
-                    auth_response = self.session.get(auth_url, params=params)
+                    auth_response = self.session.get(auth_url, params=params, timeout=self.timeout)
                     if auth_response.status_code == 200:
                         return auth_response.json().get("token")
         return None
     
+    def _auth_headers(self, host: str, repository: str) -> Dict[str, str]:
+        """获取（并缓存）某个端点上仓库的认证头"""
+        key = (host, repository)
+        if key not in self._tokens:
+            self._tokens[key] = self._get_auth_token(host, repository)
+        token = self._tokens[key]
+        return {"Authorization": f"Bearer {token}"} if token else {}
+    
     def _parse_image_name(self, image_name: str) -> Tuple[str, str, str]:
         """解析镜像名称，返回 (registry, repository, tag)"""
         parts = image_name.split("/")
@@ -67,46 +182,271 @@ class DockerRegistryClient:
         
         return registry, repository, tag
     
+    def _endpoints(self, registry: str, repository: str) -> List[Tuple[str, str]]:
+        """返回可以提供该仓库的所有端点 (host, 端点上的仓库路径)，上游在前"""
+        endpoints = [(registry, repository)]
+        for mirror in self.mirrors.get(registry, []):
+            host, _, prefix = mirror.partition("/")
+            endpoints.append((host, f"{prefix}/{repository}" if prefix else repository))
+        return endpoints
+    
+    def _stats(self, host: str) -> EndpointStats:
+        with self._lock:
+            return self.endpoint_stats.setdefault(host, EndpointStats())
+    
+    def _rank_endpoints(self, registry: str, repository: str) -> List[Tuple[str, str]]:
+        """按当前评分从快到慢排序端点
+        
+        有吞吐量数据的按吞吐量排序；尚未下载过的端点按已知最快吞吐量乐观估计，以便被尝试；
+        同分时按延迟排序，失败次数会降低评分。
+        """
+        endpoints = self._endpoints(registry, repository)
+        measured = [self._stats(h).throughput for h, _ in endpoints if self._stats(h).throughput is not None]
+        optimistic = max(measured) if measured else 0.0
+        
+        def key(endpoint):
+            stats = self._stats(endpoint[0])
+            throughput = stats.throughput if stats.throughput is not None else optimistic
+            latency = stats.latency if stats.latency is not None else float("inf")
+            return (-throughput / (1 + stats.failures), latency)
+        
+        return sorted(endpoints, key=key)
+    
+    def _request_manifest(self, host: str, repository: str, tag: str) -> Dict:
+        """从单个端点获取Manifest并校验摘要"""
+        stats = self._stats(host)
+        start = time.time()
+        try:
+            manifest_url = f"https://{host}/v2/{repository}/manifests/{tag}"
+            response = self.session.get(manifest_url, headers=self._auth_headers(host, repository), timeout=self.timeout)
+            if response.status_code == 401:
+                # 缓存的Token可能已过期（或缓存的是空Token），重新认证一次
+                self._tokens.pop((host, repository), None)
+                response = self.session.get(manifest_url, headers=self._auth_headers(host, repository), timeout=self.timeout)
+            response.raise_for_status()
+            
+            expected = response.headers.get("Docker-Content-Digest", "")
+            if expected.startswith("sha256:"):
+                actual = "sha256:" + hashlib.sha256(response.content).hexdigest()
+                if actual != expected:
+                    raise ValueError(f"Manifest digest mismatch from {host}: expected {expected}, got {actual}")
+            
+            manifest = response.json()
+        except Exception:
+            stats.record_failure()
+            raise
+        
+        stats.record_latency(time.time() - start)
+        return manifest
+    
     def get_manifest(self, image_name: str) -> Dict:
-        """获取镜像的Manifest"""
+        """获取镜像的Manifest，配置了镜像源时并发请求所有端点，采用最先成功的结果"""
         registry, repository, tag = self._parse_image_name(image_name)
+        endpoints = self._endpoints(registry, repository)
         
-        # 获取认证Token
-        token = self._get_auth_token(registry, repository)
-        if token:
-            self.session.headers.update({"Authorization": f"Bearer {token}"})
+        if len(endpoints) == 1:
+            return self._request_manifest(registry, repository, tag)
         
-        # 获取Manifest
-        manifest_url = f"https://{registry}/v2/{repository}/manifests/{tag}"
-        response = self.session.get(manifest_url)
-        response.raise_for_status()
+        # 较慢的请求在后台继续完成，仍会更新端点评分
+        executor = ThreadPoolExecutor(max_workers=len(endpoints))
+        try:
+            futures = {executor.submit(self._request_manifest, host, repo, tag): host for host, repo in endpoints}
+            errors = []
+            for future in as_completed(futures):
+                try:
+                    manifest = future.result()
+                    print(f"Got manifest from {futures[future]}")
+                    return manifest
+                except Exception as e:
+                    errors.append(f"{futures[future]}: {e}")
+        finally:
+            executor.shutdown(wait=False)
+        
+        raise RuntimeError(f"Failed to get manifest for {image_name} from all endpoints: {'; '.join(errors)}")
+    
+    def _fetch_range(self, url: str, headers: Dict[str, str], path: str, start: int, base: int,
+                     cancel: threading.Event, progress: Dict[str, int], key: str,
+                     slow: Optional[threading.Event] = None, responses: Optional[List] = None) -> int:
+        """下载blob从start开始的数据写入path（文件第0字节对应blob的base偏移），返回结束位置
+        
+        窗口内平均吞吐量低于stall_speed时中止连接并抛出StallError；低于hedge_speed时置位slow。
+        """
+        request_headers = dict(headers)
+        if start > 0:
+            request_headers["Range"] = f"bytes={start}-"
+        response = self.session.get(url, headers=request_headers, stream=True, timeout=self.timeout)
+        if responses is not None:
+            responses.append(response)
+        
+        try:
+            response.raise_for_status()
+            
+            # 记录blob总大小
+            content_range = response.headers.get("content-range", "")
+            if response.status_code == 206 and "/" in content_range:
+                progress.setdefault("total", int(content_range.rsplit("/", 1)[1]))
+            elif start == 0 and "content-length" in response.headers:
+                progress.setdefault("total", int(response.headers["content-length"]))
+            
+            if start > 0 and response.status_code != 206:
+                if base > 0:
+                    raise IOError("Server does not support range requests")
+                # 服务器不支持断点续传，从头下载
+                start = 0
+            
+            position = start
+            monitor = ThroughputMonitor(self.stall_window)
+            with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                f.seek(position - base)
+                f.truncate()
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if cancel.is_set():
+                        return position
+                    if not chunk:
+                        continue
+                    
+                    f.write(chunk)
+                    position += len(chunk)
+                    progress[key] = position
+                    
+                    rate = monitor.update(len(chunk))
+                    if rate is not None and rate < self.stall_speed:
+                        raise StallError(f"Download stalled at {rate / 1024:.1f} KB/s")
+                    if rate is not None and slow is not None and rate < self.hedge_speed:
+                        slow.set()
+            
+            total = progress.get("total")
+            if not cancel.is_set() and total is not None and position < total:
+                raise IncompleteDownloadError(f"Connection closed after {position} of {total} bytes")
+            return position
+        finally:
+            response.close()
+    
+    def _transfer(self, url: str, headers: Dict[str, str], output_path: str, offset: int, pbar: tqdm):
+        """从offset开始下载到output_path
+        
+        主连接变慢时，对剩余部分在第二个连接上发起对冲请求，先完成的一方胜出。
+        """
+        progress: Dict[str, int] = {"primary": offset}
+        hedge_path = output_path + ".hedge"
+        cancel_primary, cancel_hedge = threading.Event(), threading.Event()
+        slow = threading.Event()
+        primary_responses, hedge_responses = [], []
+        
+        executor = ThreadPoolExecutor(max_workers=2)
+        primary = executor.submit(self._fetch_range, url, headers, output_path, offset, 0,
+                                  cancel_primary, progress, "primary", slow, primary_responses)
+        hedge = None
+        hedge_offset = 0
+        
+        try:
+            while True:
+                wait([f for f in (primary, hedge) if f is not None], timeout=0.5, return_when=FIRST_COMPLETED)
+                covered = max(progress["primary"], progress.get("hedge", 0))
+                pbar.total = progress.get("total", pbar.total)
+                pbar.update(covered - pbar.n)
+                
+                if primary.done() and primary.exception() is None:
+                    if hedge is not None:
+                        cancel_hedge.set()
+                        for response in hedge_responses:
+                            response.close()
+                    return
+                
+                if hedge is not None and hedge.done() and hedge.exception() is None:
+                    # 对冲请求先完成：停止主连接，把对冲部分拼接到hedge_offset之后
+                    cancel_primary.set()
+                    for response in primary_responses:
+                        response.close()
+                    wait([primary])
+                    with open(output_path, "r+b") as f, open(hedge_path, "rb") as hf:
+                        f.seek(hedge_offset)
+                        f.truncate()
+                        shutil.copyfileobj(hf, f)
+                    print(f"Hedged request finished first for {url.rsplit('/', 1)[1][:19]}")
+                    return
+                
+                if primary.done() and (hedge is None or hedge.done()):
+                    # 全部失败，抛出主连接的错误由上层重试
+                    raise primary.exception()
+                
+                remaining = progress.get("total", 0) - progress["primary"]
+                if hedge is None and slow.is_set() and not primary.done() and remaining >= self.hedge_min_bytes:
+                    hedge_offset = progress["primary"]
+                    progress["hedge"] = hedge_offset
+                    hedge = executor.submit(self._fetch_range, url, headers, hedge_path, hedge_offset, hedge_offset,
+                                            cancel_hedge, progress, "hedge", None, hedge_responses)
+        finally:
+            cancel_primary.set()
+            cancel_hedge.set()
+            executor.shutdown(wait=True)
+            if os.path.exists(hedge_path):
+                os.remove(hedge_path)
+    
+    def _verify_digest(self, path: str, digest: str) -> bool:
+        """校验文件摘要"""
+        algorithm, expected = digest.split(":", 1)
+        hasher = hashlib.new(algorithm)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(block)
+        return hasher.hexdigest() == expected
+    
+    def _download_blob(self, host: str, repository: str, digest: str, output_path: str):
+        """从单个端点下载blob，连接出错、卡顿或5xx时按指数退避断点续传，完成后校验摘要
+        
+        4xx直接抛出由上层换端点；401时丢弃缓存的Token重新认证一次。
+        """
+        layer_url = f"https://{host}/v2/{repository}/blobs/{digest}"
+        start = time.time()
+        
+        # 写入文件
+        with tqdm(total=0, unit="B", unit_scale=True, desc=f"Pulling layer {digest[:12]} from {host}") as pbar:
+            offset = 0
+            attempt = 0
+            reauthenticated = False
+            while True:
+                try:
+                    self._transfer(layer_url, self._auth_headers(host, repository), output_path, offset, pbar)
+                    break
+                except IOError as e:
+                    if _http_status(e) == 401 and not reauthenticated:
+                        print(f"Authentication rejected by {host}, requesting a new token")
+                        self._tokens.pop((host, repository), None)
+                        reauthenticated = True
+                        continue
+                    if not _is_retryable(e) or attempt == self.max_retries:
+                        raise
+                    offset = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+                    delay = self.backoff_factor * 2 ** attempt
+                    attempt += 1
+                    print(f"Download of {digest[:19]} from {host} failed ({e}), resuming at byte {offset} in {delay:.1f}s")
+                    time.sleep(delay)
+        
+        if not self._verify_digest(output_path, digest):
+            raise ValueError(f"Digest mismatch for {digest} from {host}")
         
-        return response.json()
+        self._stats(host).record_throughput(os.path.getsize(output_path), time.time() - start)
     
     def pull_layer(self, image_name: str, digest: str, output_path: str) -> str:
-        """拉取单个镜像层"""
+        """拉取单个镜像层，优先使用当前最快的端点，失败或摘要不符时换下一个"""
         registry, repository, _ = self._parse_image_name(image_name)
         
         # 确保目录存在
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
-        # 获取层数据
-        layer_url = f"https://{registry}/v2/{repository}/blobs/{digest}"
-        response = self.session.get(layer_url, stream=True)
-        response.raise_for_status()
+        errors = []
+        for host, repo in self._rank_endpoints(registry, repository):
+            try:
+                self._download_blob(host, repo, digest, output_path)
+                return output_path
+            except (IOError, ValueError) as e:
+                self._stats(host).record_failure()
+                errors.append(f"{host}: {e}")
+                if os.path.exists(output_path):
+                    os.remove(output_path)
         
-        # 计算文件大小
-        total_size = int(response.headers.get("content-length", 0))
-        
-        # 写入文件
-        with open(output_path, "wb") as f:
-            with tqdm(total=total_size, unit="B", unit_scale=True, desc=f"Pulling layer {digest[:12]}") as pbar:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        pbar.update(len(chunk))
-        
-        return output_path
+        raise RuntimeError(f"Failed to pull {digest} from all endpoints: {'; '.join(errors)}")
     
     def pull_image(self, image_name: str, output_dir: str) -> str:
         """拉取完整镜像"""
@@ -150,10 +490,9 @@ class DockerRegistryClient:
         manifest = self.get_manifest(image_name)
         config_digest = manifest["config"]["digest"]
         
-        registry, repository, _ = self._parse_image_name(image_name)
-        config_url = f"https://{registry}/v2/{repository}/blobs/{config_digest}"
-        
-        response = self.session.get(config_url)
-        response.raise_for_status()
-        
-        return response.json()
\ No newline at end of file
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config_path = os.path.join(temp_dir, "config.json")
+            self.pull_layer(image_name, config_digest, config_path)
+            
+            with open(config_path, "r") as f:
+                return json.load(f)
\ No newline at end of file
@@ -1,10 +1,13 @@
 import click
 import os
+import sys
+import time
 import tempfile
-from docker_tool.registry import DockerRegistryClient
+from docker_tool.registry import DockerRegistryClient, parse_mirror_specs
 from docker_tool.image_packer import DockerImagePacker
 from docker_tool.ssh_client import SSHClient
 from docker_tool.deployer import DockerDeployer
+from docker_tool.archive_index import ArchiveIndex
 
 @click.group()
 def cli():
@@ -17,12 +20,26 @@ def cli():
 @cli.command()
 @click.argument('image_name')
 @click.option('--output-dir', '-o', default='./images', help='输出目录')
-def pull(image_name, output_dir):
+@click.option('--pack', 'pack_output_dir', help='边拉取边打包为TAR文件到该目录，不在本地保留各层文件')
+@click.option('--workers', '-w', type=int, help='并行压缩线程数，默认使用全部CPU核心')
+@click.option('--mirror', '-m', multiple=True, help='镜像源，格式为 REGISTRY=MIRROR，可多次指定')
+@click.option('--connect-timeout', default=10.0, help='连接超时（秒）')
+@click.option('--read-timeout', default=60.0, help='读取超时（秒）')
+@click.option('--retries', default=4, help='下载失败或卡顿时的最大重试次数')
+def pull(image_name, output_dir, pack_output_dir, workers, mirror, connect_timeout, read_timeout, retries):
     """拉取Docker镜像到本地"""
     print(f"Pulling image: {image_name}")
     
     # 创建Registry客户端
-    client = DockerRegistryClient()
+    client = DockerRegistryClient(mirrors=parse_mirror_specs(mirror), connect_timeout=connect_timeout,
+                                  read_timeout=read_timeout, max_retries=retries)
+    
+    # 边拉取边打包，额外磁盘占用约为一个镜像大小
+    if pack_output_dir:
+        packer = DockerImagePacker(compress_workers=workers)
+        tar_path = packer.pull_and_pack(client, image_name, pack_output_dir)
+        print(f"Successfully pulled and packed image to {tar_path}")
+        return
     
     # 创建输出目录
     os.makedirs(output_dir, exist_ok=True)
@@ -37,12 +54,13 @@ def pull(image_name, output_dir):
 @click.argument('image_dir')
 @click.argument('image_name')
 @click.option('--output-dir', '-o', default='./tar_images', help='输出目录')
-def pack(image_dir, image_name, output_dir):
+@click.option('--workers', '-w', type=int, help='并行压缩线程数，默认使用全部CPU核心')
+def pack(image_dir, image_name, output_dir, workers):
     """将拉取的镜像打包为TAR文件"""
     print(f"Packing image: {image_name}")
     
     # 创建打包器
-    packer = DockerImagePacker()
+    packer = DockerImagePacker(compress_workers=workers)
     
     # 打包镜像
     tar_path = packer.pack_image(image_name, image_dir, output_dir)
@@ -58,21 +76,23 @@ def pack(image_dir, image_name, output_dir):
 @click.option('--key-file', '-k', help='SSH私钥文件路径')
 @click.option('--remote-dir', default='/tmp', help='远程服务器临时目录')
 @click.option('--run', is_flag=True, help='是否运行容器')
-def deploy(image_name, hostname, port, username, password, key_file, remote_dir, run):
+@click.option('--workers', '-w', type=int, help='并行压缩线程数，默认使用全部CPU核心')
+@click.option('--mirror', '-m', multiple=True, help='镜像源，格式为 REGISTRY=MIRROR，可多次指定')
+@click.option('--connect-timeout', default=10.0, help='连接超时（秒）')
+@click.option('--read-timeout', default=60.0, help='读取超时（秒）')
+@click.option('--retries', default=4, help='下载失败或卡顿时的最大重试次数')
+def deploy(image_name, hostname, port, username, password, key_file, remote_dir, run, workers, mirror,
+           connect_timeout, read_timeout, retries):
     """拉取镜像，传输到Linux服务器并部署"""
     print(f"Deploying image: {image_name} to {hostname}")
     
-    # 1. 拉取镜像到临时目录
-    print("Step 1: Pulling image...")
+    # 1-2. 边拉取边打包到临时目录
+    print("Step 1-2: Pulling and packing image...")
     with tempfile.TemporaryDirectory() as temp_dir:
-        client = DockerRegistryClient()
-        image_dir = os.path.join(temp_dir, image_name.replace('/', '_').replace(':', '_'))
-        client.pull_image(image_name, image_dir)
-        
-        # 2. 打包镜像为TAR
-        print("Step 2: Packing image...")
-        packer = DockerImagePacker()
-        tar_path = packer.pack_image(image_name, image_dir, temp_dir)
+        client = DockerRegistryClient(mirrors=parse_mirror_specs(mirror), connect_timeout=connect_timeout,
+                                      read_timeout=read_timeout, max_retries=retries)
+        packer = DockerImagePacker(compress_workers=workers)
+        tar_path = packer.pull_and_pack(client, image_name, temp_dir)
         
         # 3. 传输到远程服务器
         print("Step 3: Transferring image to remote server...")
@@ -96,6 +116,71 @@ def deploy(image_name, hostname, port, username, password, key_file, remote_dir,
     
     print(f"Successfully deployed image: {image_name} to {hostname}")
 
+@cli.command()
+@click.argument('hostname')
+@click.argument('image_names', nargs=-1, required=True)
+@click.option('--port', '-p', default=22, help='SSH端口')
+@click.option('--username', '-u', default='root', help='SSH用户名')
+@click.option('--password', '-P', help='SSH密码')
+@click.option('--key-file', '-k', help='SSH私钥文件路径')
+@click.option('--remote-dir', default='/tmp', help='远程服务器临时目录')
+@click.option('--run', is_flag=True, help='是否运行容器')
+@click.option('--parallel', default=4, help='远程服务器上同时加载的镜像数')
+@click.option('--workers', '-w', type=int, help='并行压缩线程数，默认使用全部CPU核心')
+@click.option('--mirror', '-m', multiple=True, help='镜像源，格式为 REGISTRY=MIRROR，可多次指定')
+@click.option('--connect-timeout', default=10.0, help='连接超时（秒）')
+@click.option('--read-timeout', default=60.0, help='读取超时（秒）')
+@click.option('--retries', default=4, help='下载失败或卡顿时的最大重试次数')
+def deploy_stack(hostname, image_names, port, username, password, key_file, remote_dir, run, parallel, workers,
+                 mirror, connect_timeout, read_timeout, retries):
+    """拉取多个镜像，传输到Linux服务器后并发加载部署"""
+    print(f"Deploying {len(image_names)} images to {hostname}")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # 1. 连接远程服务器
+        ssh_client = SSHClient(hostname, port, username)
+        if not ssh_client.connect(password, key_file):
+            print("Failed to connect to remote server")
+            return
+        
+        # 2. 逐个拉取、打包并上传，上传后删除本地TAR以节省磁盘
+        client = DockerRegistryClient(mirrors=parse_mirror_specs(mirror), connect_timeout=connect_timeout,
+                                      read_timeout=read_timeout, max_retries=retries)
+        packer = DockerImagePacker(compress_workers=workers)
+        deployer = DockerDeployer(ssh_client)
+        images = []
+        current = None
+        success = False
+        try:
+            for image_name in image_names:
+                current = image_name
+                print(f"Pulling, packing and uploading {image_name}...")
+                tar_path = packer.pull_and_pack(client, image_name, temp_dir)
+                remote_image_path = ssh_client.upload_image(tar_path, remote_dir)
+                os.remove(tar_path)
+                if not remote_image_path:
+                    raise RuntimeError(f"Failed to upload {tar_path}")
+                images.append((remote_image_path, image_name))
+            current = None
+            
+            # 3. 在远程服务器上并发加载（完成后会删除远程TAR）
+            print(f"Loading images on remote server with up to {parallel} concurrent loads...")
+            success = deployer.deploy_images(images, parallel, run)
+            images = []
+        except Exception as e:
+            where = f" while processing {current}" if current else ""
+            print(f"Deployment to {hostname} failed{where}: {e}")
+        finally:
+            # 4. 清理已上传但未加载的远程TAR并断开连接
+            for remote_image_path, _ in images:
+                deployer.remove_remote_image_file(remote_image_path)
+            ssh_client.disconnect()
+    
+    if success:
+        print(f"Successfully deployed {len(image_names)} images to {hostname}")
+    else:
+        print(f"Some images failed to deploy to {hostname}")
+
 @cli.command()
 @click.argument('tar_path')
 @click.argument('hostname')
@@ -135,5 +220,50 @@ def upload(tar_path, hostname, image_name, port, username, password, key_file, r
     
     print(f"Successfully uploaded and deployed image: {tar_path} to {hostname}")
 
+@cli.command()
+@click.argument('tar_path')
+@click.option('--layer', '-l', help='只查看指定的层（可使用名称的唯一前缀）')
+@click.option('--list', 'list_files', is_flag=True, help='列出层中的所有文件')
+@click.option('--find', 'find_path', help='查找包含该文件的层')
+@click.option('--cat', 'cat_path', help='输出文件内容（默认取包含该文件的最上层）')
+@click.option('--rebuild', is_flag=True, help='忽略已有索引，重新建立')
+def inspect(tar_path, layer, list_files, find_path, cat_path, rebuild):
+    """不解压查看镜像TAR文件中各层的内容"""
+    if not os.path.exists(tar_path):
+        print(f"File not found: {tar_path}")
+        return
+    
+    # 首次使用时建立索引，之后直接复用 <tar_path>.index.json
+    start = time.time()
+    index = ArchiveIndex.load_or_build(tar_path, rebuild=rebuild)
+    print(f"Index ready in {(time.time() - start) * 1000:.1f} ms", file=sys.stderr)
+    
+    # --list只显示层名称的前12个字符，这里同样接受唯一前缀
+    if layer:
+        try:
+            layer = index.resolve_layer(layer)
+        except (KeyError, ValueError) as e:
+            raise click.BadParameter(e.args[0], param_hint="'--layer'")
+    
+    if cat_path:
+        try:
+            click.echo(index.read_file(cat_path, layer), nl=False)
+        except (FileNotFoundError, ValueError) as e:
+            print(e, file=sys.stderr)
+    elif find_path:
+        layers = index.find(find_path)
+        if not layers:
+            print(f"File not found in any layer: {find_path}")
+        for name in layers:
+            print(name)
+    elif list_files:
+        for name, path, size in index.list_files(layer):
+            print(f"{name[:12]}  {size:>12}  {path}")
+    else:
+        for name in index.layers():
+            files = index.data["layers"][name]["files"]
+            size = index.data["members"][name]["size"]
+            print(f"{name}  {len(files):>8} files  {size / 1024 / 1024:>10.1f} MB")
+
 if __name__ == '__main__':
     cli()
\ No newline at end of file
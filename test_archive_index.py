@@ -0,0 +1,172 @@
+import hashlib
+import io
+import json
+import os
+import tarfile
+import tempfile
+from click.testing import CliRunner
+from docker_tool.image_packer import DockerImagePacker
+from docker_tool.archive_index import ArchiveIndex
+from main import cli
+
+def make_layer(files, compress=True):
+    """生成一个层的tar数据"""
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz" if compress else "w") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+def make_image_archive(temp_dir, layers):
+    """用DockerImagePacker打包出一个包含给定层的镜像TAR文件"""
+    image_dir = os.path.join(temp_dir, "image")
+    os.makedirs(os.path.join(image_dir, "layers"))
+
+    digests = []
+    for layer in layers:
+        layer_hash = hashlib.sha256(layer).hexdigest()
+        digests.append(layer_hash)
+        with open(os.path.join(image_dir, "layers", f"{layer_hash}.tar.gz"), "wb") as f:
+            f.write(layer)
+    with open(os.path.join(image_dir, "config.json"), "w") as f:
+        json.dump({"architecture": "amd64"}, f)
+    with open(os.path.join(image_dir, "manifest.json"), "w") as f:
+        json.dump({
+            "config": {"digest": "sha256:" + "c" * 64},
+            "layers": [{"digest": f"sha256:{h}"} for h in digests]
+        }, f)
+
+    packer = DockerImagePacker(block_size=64 * 1024)
+    return packer.pack_image("nginx:latest", image_dir, os.path.join(temp_dir, "out")), digests
+
+# 测试通过索引查找和读取层中的文件
+def test_find_and_read_file():
+    big = os.urandom(512 * 1024)
+    layers = [
+        make_layer({"./etc/nginx/nginx.conf": b"worker_processes 1;\n", "usr/bin/app": big}),
+        make_layer({"etc/nginx/nginx.conf": b"worker_processes 4;\n"}, compress=False),
+    ]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tar_path, digests = make_image_archive(temp_dir, layers)
+        index = ArchiveIndex.load_or_build(tar_path)
+
+        # 多块并行压缩的归档会为每个gzip成员记录检查点
+        assert len(index.data["checkpoints"]) > 1
+        assert index.layers() == [f"{h}.tar.gz" for h in digests]
+        assert index.find("/etc/nginx/nginx.conf") == [f"{h}.tar.gz" for h in digests]
+
+        assert index.read_file("etc/nginx/nginx.conf") == b"worker_processes 4;\n"
+        assert index.read_file("etc/nginx/nginx.conf", f"{digests[0]}.tar.gz") == b"worker_processes 1;\n"
+        assert index.read_file("usr/bin/app") == big
+        assert json.loads(index.read_member("manifest.json"))[0]["RepoTags"] == ["nginx:latest"]
+
+# 测试索引持久化复用，归档变化后自动重建
+def test_index_is_reused_and_invalidated():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tar_path, _ = make_image_archive(temp_dir, [make_layer({"etc/hostname": b"web\n"})])
+        index_path = tar_path + ".index.json"
+
+        ArchiveIndex.load_or_build(tar_path)
+        with open(index_path, "r") as f:
+            data = json.load(f)
+        data["layers"] = {}
+        with open(index_path, "w") as f:
+            json.dump(data, f)
+
+        # 指纹未变时直接使用已保存的索引
+        assert ArchiveIndex.load_or_build(tar_path).layers() == []
+
+        # 归档修改后指纹变化，重新建立索引
+        os.utime(tar_path, ns=(0, 0))
+        assert ArchiveIndex.load_or_build(tar_path).find("etc/hostname")
+
+# 测试索引文件损坏时重建，无法保存索引时仍可使用
+def test_damaged_or_unwritable_index():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tar_path, _ = make_image_archive(temp_dir, [make_layer({"etc/hostname": b"web\n"})])
+        index_path = tar_path + ".index.json"
+
+        ArchiveIndex.load_or_build(tar_path)
+        with open(index_path, "r+") as f:
+            f.truncate(os.path.getsize(index_path) // 2)
+
+        assert ArchiveIndex.load_or_build(tar_path).read_file("etc/hostname") == b"web\n"
+        with open(index_path, "r") as f:
+            assert json.load(f)["layers"]
+        assert not os.path.exists(index_path + ".tmp")
+
+        # 缺少字段的索引同样重建
+        with open(index_path, "r") as f:
+            data = json.load(f)
+        del data["members"]
+        with open(index_path, "w") as f:
+            json.dump(data, f)
+        assert ArchiveIndex.load_or_build(tar_path).find("etc/hostname")
+
+        unwritable = os.path.join(temp_dir, "missing", "index.json")
+        assert ArchiveIndex.load_or_build(tar_path, unwritable).read_file("etc/hostname") == b"web\n"
+
+def make_layers_with_common_prefix():
+    """生成两个摘要首字符相同的层，返回 (层数据列表, 公共前缀)"""
+    by_prefix = {}
+    for i in range(17):
+        layer = make_layer({"etc/hostname": f"host{i}\n".encode()})
+        prefix = hashlib.sha256(layer).hexdigest()[0]
+        if prefix in by_prefix:
+            return [by_prefix[prefix], layer], prefix
+        by_prefix[prefix] = layer
+
+# 测试按唯一前缀指定层，未知或不唯一的前缀报错
+def test_resolve_layer_prefix():
+    layers, common = make_layers_with_common_prefix()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tar_path, digests = make_image_archive(temp_dir, layers)
+        index = ArchiveIndex.load_or_build(tar_path)
+
+        assert index.resolve_layer(f"{digests[1]}.tar.gz") == f"{digests[1]}.tar.gz"
+        assert index.resolve_layer(digests[0][:12]) == f"{digests[0]}.tar.gz"
+        assert index.read_file("etc/hostname", digests[0][:12]) == index.read_file("etc/hostname", f"{digests[0]}.tar.gz")
+        assert [name for name, _, _ in index.list_files(digests[1][:12])] == [f"{digests[1]}.tar.gz"]
+
+        for name, error in (("zzz", KeyError), (common, ValueError)):
+            try:
+                index.resolve_layer(name)
+            except error:
+                pass
+            else:
+                raise AssertionError(f"Expected {error.__name__} for {name}")
+
+# 测试inspect命令的--layer参数接受--list显示的短名称
+def test_inspect_layer_option():
+    layers, common = make_layers_with_common_prefix()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tar_path, digests = make_image_archive(temp_dir, layers)
+        runner = CliRunner()
+
+        result = runner.invoke(cli, ["inspect", tar_path, "--list", "--layer", digests[0][:12]])
+        assert result.exit_code == 0
+        assert "etc/hostname" in result.output
+
+        result = runner.invoke(cli, ["inspect", tar_path, "--cat", "etc/hostname", "--layer", digests[1][:12]])
+        assert result.exit_code == 0
+        assert "host" in result.output
+
+        result = runner.invoke(cli, ["inspect", tar_path, "--list", "--layer", "zzz"])
+        assert result.exit_code == 2
+        assert "Unknown layer: zzz" in result.output
+
+        result = runner.invoke(cli, ["inspect", tar_path, "--list", "--layer", common])
+        assert result.exit_code == 2
+        assert "Ambiguous layer prefix" in result.output
+
+if __name__ == "__main__":
+    test_find_and_read_file()
+    test_index_is_reused_and_invalidated()
+    test_damaged_or_unwritable_index()
+    test_resolve_layer_prefix()
+    test_inspect_layer_option()
@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from click.testing import CliRunner
+import main
+from docker_tool.deployer import DockerDeployer
+
+class FakeSSHClient:
+    """模拟SSH客户端，记录执行的命令和docker load的最大并发数"""
+
+    def __init__(self, tools):
+        self.tools = tools
+        self.commands = []
+        self.running_loads = 0
+        self.max_running_loads = 0
+        self.lock = threading.Lock()
+
+    def execute_command(self, command):
+        with self.lock:
+            self.commands.append(command)
+        if command.startswith("command -v "):
+            return (0 if command.split()[-1] in self.tools else 1), "", ""
+        if "docker load" in command:
+            with self.lock:
+                self.running_loads += 1
+                self.max_running_loads = max(self.max_running_loads, self.running_loads)
+            time.sleep(0.05)
+            with self.lock:
+                self.running_loads -= 1
+            return 0, "Loaded image", ""
+        return 0, "", ""
+
+# 测试有pigz时通过管道解压后加载
+def test_load_command_uses_pigz():
+    deployer = DockerDeployer(FakeSSHClient(tools={"pigz"}))
+    assert deployer._load_command("/tmp/nginx_latest.tar.gz") == "pigz -dc /tmp/nginx_latest.tar.gz | docker load"
+    assert deployer._load_command("/tmp/nginx_latest.tar") == "docker load -i /tmp/nginx_latest.tar"
+
+# 测试没有解压工具时回退到docker load -i
+def test_load_command_without_decompressor():
+    deployer = DockerDeployer(FakeSSHClient(tools=set()))
+    assert deployer._load_command("/tmp/nginx_latest.tar.gz") == "docker load -i /tmp/nginx_latest.tar.gz"
+
+# 测试并发加载数不超过限制
+def test_load_images_concurrently():
+    ssh_client = FakeSSHClient(tools={"pigz"})
+    deployer = DockerDeployer(ssh_client)
+    paths = [f"/tmp/image{i}.tar.gz" for i in range(8)]
+
+    results = deployer.load_images(paths, max_parallel=3)
+
+    assert results == {path: True for path in paths}
+    assert ssh_client.max_running_loads == 3
+    assert sum(c.startswith("command -v pigz") for c in ssh_client.commands) == 1
+
+class FakePacker:
+    """模拟打包器，fail_image指定打包时抛出异常的镜像"""
+
+    def __init__(self, fail_image):
+        self.fail_image = fail_image
+
+    def pull_and_pack(self, client, image_name, output_dir):
+        if image_name == self.fail_image:
+            raise RuntimeError(f"Failed to pull {image_name}")
+        tar_path = os.path.join(output_dir, image_name.replace(":", "_") + ".tar.gz")
+        with open(tar_path, "wb") as f:
+            f.write(b"image")
+        return tar_path
+
+# 测试批量部署中途失败时清理已上传的远程TAR并断开连接
+def test_deploy_stack_cleans_up_on_failure():
+    ssh_client = FakeSSHClient(tools={"pigz"})
+    ssh_client.connect = lambda password, key_file: True
+    ssh_client.upload_image = lambda tar_path, remote_dir: f"{remote_dir}/{os.path.basename(tar_path)}"
+    ssh_client.disconnected = False
+
+    def disconnect():
+        ssh_client.disconnected = True
+    ssh_client.disconnect = disconnect
+
+    originals = main.SSHClient, main.DockerImagePacker
+    main.SSHClient = lambda hostname, port, username: ssh_client
+    main.DockerImagePacker = lambda compress_workers=None: FakePacker("redis:7")
+    try:
+        result = CliRunner().invoke(main.cli, ["deploy-stack", "10.0.0.1", "nginx:latest", "mysql:8", "redis:7"])
+    finally:
+        main.SSHClient, main.DockerImagePacker = originals
+
+    assert result.exit_code == 0
+    assert "while processing redis:7" in result.output
+    assert "Some images failed to deploy" in result.output
+    assert ssh_client.disconnected
+    assert [c for c in ssh_client.commands if c.startswith("rm -f")] == [
+        "rm -f /tmp/nginx_latest.tar.gz", "rm -f /tmp/mysql_8.tar.gz"]
+    assert not any("docker load" in c for c in ssh_client.commands)
+
+if __name__ == "__main__":
+    test_load_command_uses_pigz()
+    test_load_command_without_decompressor()
+    test_load_images_concurrently()
+    test_deploy_stack_cleans_up_on_failure()
@@ -0,0 +1,65 @@
+import gzip
+import json
+import os
+import tarfile
+import tempfile
+from docker_tool.parallel_gzip import ParallelGzipWriter
+from docker_tool.image_packer import DockerImagePacker
+
+# 测试多块并行压缩的输出可以被标准gzip解压
+def test_parallel_gzip_roundtrip():
+    data = os.urandom(300 * 1024) + b"docker" * 200000
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "data.gz")
+        with ParallelGzipWriter(path, workers=4, block_size=64 * 1024) as gz:
+            for i in range(0, len(data), 10000):
+                gz.write(data[i:i + 10000])
+
+        with gzip.open(path, "rb") as f:
+            assert f.read() == data
+        assert gz.bytes_in == len(data)
+        assert gz.bytes_out == os.path.getsize(path)
+        print(gz.summary())
+
+# 测试空输入也生成合法的gzip文件
+def test_parallel_gzip_empty():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "empty.gz")
+        ParallelGzipWriter(path).close()
+
+        with gzip.open(path, "rb") as f:
+            assert f.read() == b""
+
+# 测试打包结果可以被tarfile正常读取
+def test_pack_image_with_parallel_gzip():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        image_dir = os.path.join(temp_dir, "image")
+        os.makedirs(os.path.join(image_dir, "layers"))
+
+        layer_hash = "a" * 64
+        with open(os.path.join(image_dir, "layers", f"{layer_hash}.tar.gz"), "wb") as f:
+            f.write(os.urandom(200 * 1024))
+        with open(os.path.join(image_dir, "config.json"), "w") as f:
+            json.dump({"architecture": "amd64"}, f)
+        with open(os.path.join(image_dir, "manifest.json"), "w") as f:
+            json.dump({
+                "config": {"digest": "sha256:" + "c" * 64},
+                "layers": [{"digest": f"sha256:{layer_hash}"}]
+            }, f)
+
+        packer = DockerImagePacker(compress_workers=2, block_size=32 * 1024)
+        tar_path = packer.pack_image("nginx:latest", image_dir, os.path.join(temp_dir, "out"))
+
+        with tarfile.open(tar_path, "r:gz") as tar:
+            names = sorted(tar.getnames())
+            manifest = json.load(tar.extractfile("manifest.json"))
+
+        assert names == sorted(["manifest.json", "c" * 64 + ".json", f"{layer_hash}.tar.gz"])
+        assert manifest[0]["RepoTags"] == ["nginx:latest"]
+        assert manifest[0]["Layers"] == [f"{layer_hash}.tar.gz"]
+
+if __name__ == "__main__":
+    test_parallel_gzip_roundtrip()
+    test_parallel_gzip_empty()
+    test_pack_image_with_parallel_gzip()
@@ -0,0 +1,139 @@
+import json
+import os
+import tarfile
+import tempfile
+import time
+from docker_tool import image_packer
+from docker_tool.image_packer import DiskUsageTracker, DockerImagePacker
+from docker_tool.parallel_gzip import ParallelGzipWriter
+
+class FakeRegistryClient:
+    """模拟Registry客户端，记录每层下载时临时目录中的文件"""
+
+    def __init__(self, blobs, delay=0.0, fail_digest=None, hedge=False):
+        self.blobs = blobs
+        self.delay = delay
+        self.fail_digest = fail_digest
+        self.hedge = hedge
+        self.files_seen = []
+
+    def get_manifest(self, image_name):
+        digests = list(self.blobs)
+        return {
+            "config": {"digest": digests[0]},
+            "layers": [{"digest": d} for d in digests[1:]]
+        }
+
+    def pull_layer(self, image_name, digest, output_path):
+        self.files_seen.append(sorted(os.listdir(os.path.dirname(output_path))))
+        if digest == self.fail_digest:
+            raise RuntimeError(f"Failed to pull {digest}")
+        time.sleep(self.delay)
+        with open(output_path, "wb") as f:
+            f.write(self.blobs[digest])
+        if self.hedge:
+            # 模拟对冲下载：完成前短暂存在一个与层同样大小的 .hedge 文件
+            with open(output_path + ".hedge", "wb") as f:
+                f.write(self.blobs[digest])
+            time.sleep(0.3)
+            os.remove(output_path + ".hedge")
+        return output_path
+
+# 测试边拉取边打包：每次只保留一个层文件，输出与普通打包一致
+def test_pull_and_pack():
+    blobs = {"sha256:" + "c" * 64: json.dumps({"architecture": "amd64"}).encode("utf-8")}
+    for i in range(3):
+        blobs["sha256:" + str(i) * 64] = os.urandom(100 * 1024)
+
+    client = FakeRegistryClient(blobs)
+    packer = DockerImagePacker(compress_workers=2)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tar_path = packer.pull_and_pack(client, "nginx:latest", temp_dir)
+
+        # 下载新层时上一层已经被删除
+        assert all(files == [] for files in client.files_seen)
+        assert os.listdir(temp_dir) == ["nginx_latest.tar.gz"]
+
+        with tarfile.open(tar_path, "r:gz") as tar:
+            manifest = json.load(tar.extractfile("manifest.json"))
+            for digest, data in blobs.items():
+                name = digest.split(":")[1] + (".json" if digest.startswith("sha256:c") else ".tar.gz")
+                assert tar.extractfile(name).read() == data
+
+        assert manifest[0]["RepoTags"] == ["nginx:latest"]
+        assert manifest[0]["Layers"] == [str(i) * 64 + ".tar.gz" for i in range(3)]
+
+# 测试压缩耗时不包含下载时间
+def test_pull_and_pack_elapsed_excludes_downloads():
+    blobs = {"sha256:" + "c" * 64: b"{}"}
+    for i in range(3):
+        blobs["sha256:" + str(i) * 64] = os.urandom(64 * 1024)
+
+    client = FakeRegistryClient(blobs, delay=0.2)
+    packer = DockerImagePacker(compress_workers=2)
+    writers = []
+
+    class RecordingWriter(ParallelGzipWriter):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            writers.append(self)
+
+    original = image_packer.ParallelGzipWriter
+    image_packer.ParallelGzipWriter = RecordingWriter
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            start = time.time()
+            packer.pull_and_pack(client, "nginx:latest", temp_dir)
+            assert time.time() - start >= 0.8
+    finally:
+        image_packer.ParallelGzipWriter = original
+
+    assert writers[0].elapsed < 0.4
+
+# 测试下载失败时不留下半成品归档
+def test_pull_and_pack_failure_leaves_no_archive():
+    blobs = {"sha256:" + "c" * 64: b"{}"}
+    for i in range(3):
+        blobs["sha256:" + str(i) * 64] = os.urandom(64 * 1024)
+
+    client = FakeRegistryClient(blobs, fail_digest="sha256:" + "1" * 64)
+    packer = DockerImagePacker(compress_workers=2)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        try:
+            packer.pull_and_pack(client, "nginx:latest", temp_dir)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("Expected RuntimeError")
+        assert os.listdir(temp_dir) == []
+
+# 测试峰值磁盘占用包含对冲下载的临时文件
+def test_pull_and_pack_peak_includes_hedge_file():
+    layer = os.urandom(1024 * 1024)
+    blobs = {"sha256:" + "c" * 64: b"{}", "sha256:" + "0" * 64: layer}
+    client = FakeRegistryClient(blobs, hedge=True)
+    packer = DockerImagePacker(compress_workers=2)
+    trackers = []
+
+    class RecordingTracker(DiskUsageTracker):
+        def __init__(self):
+            super().__init__()
+            trackers.append(self)
+
+    original = image_packer.DiskUsageTracker
+    image_packer.DiskUsageTracker = RecordingTracker
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            packer.pull_and_pack(client, "nginx:latest", temp_dir)
+    finally:
+        image_packer.DiskUsageTracker = original
+
+    assert trackers[0].peak >= 2 * len(layer)
+
+if __name__ == "__main__":
+    test_pull_and_pack()
+    test_pull_and_pack_elapsed_excludes_downloads()
+    test_pull_and_pack_failure_leaves_no_archive()
+    test_pull_and_pack_peak_includes_hedge_file()
@@ -0,0 +1,207 @@
+import hashlib
+import os
+import tempfile
+import time
+import requests
+from docker_tool.registry import DockerRegistryClient, parse_mirror_specs
+
+MIRROR = "swr.cn-north-4.myhuaweicloud.com/ddn-k8s/docker.io"
+
+class FakeResponse:
+    def __init__(self, content, status_code=200, headers=None, delay=0.0):
+        self.content = content
+        self.status_code = status_code
+        self.headers = {"content-length": str(len(content))}
+        self.headers.update(headers or {})
+        self.delay = delay
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error", response=self)
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            time.sleep(self.delay)
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+class FakeSession:
+    """按host返回预设内容，支持Range请求，并记录请求头；slow_requests指定前几次请求每块的延迟
+
+    errors_by_host按顺序指定某个host前几次blob请求返回的错误状态码。
+    """
+
+    def __init__(self, blobs_by_host, slow_requests=0, delay=0.0, errors_by_host=None):
+        self.blobs_by_host = blobs_by_host
+        self.slow_requests = slow_requests
+        self.delay = delay
+        self.errors_by_host = errors_by_host or {}
+        self.requested = []
+        self.auth_requests = 0
+
+    def get(self, url, headers=None, **kwargs):
+        if kwargs.get("allow_redirects") is False:
+            self.auth_requests += 1
+            return FakeResponse(b"", status_code=200)
+
+        headers = headers or {}
+        self.requested.append((url, headers.get("Range")))
+        host = url.split("/")[2]
+        errors = self.errors_by_host.get(host)
+        if errors:
+            return FakeResponse(b"", status_code=errors.pop(0))
+        data = self.blobs_by_host[host]
+
+        delay = self.delay if self.slow_requests > 0 else 0.0
+        self.slow_requests -= 1
+
+        if "Range" in headers:
+            start = int(headers["Range"][len("bytes="):].split("-")[0])
+            return FakeResponse(data[start:], status_code=206,
+                                headers={"content-range": f"bytes {start}-{len(data) - 1}/{len(data)}"})
+        return FakeResponse(data, delay=delay)
+
+# 测试镜像源配置解析与端点路径
+def test_mirror_endpoints():
+    mirrors = parse_mirror_specs([f"registry-1.docker.io={MIRROR}/"])
+    assert mirrors == {"registry-1.docker.io": [MIRROR]}
+
+    client = DockerRegistryClient(mirrors=mirrors)
+    assert client._endpoints("registry-1.docker.io", "milvusdb/milvus") == [
+        ("registry-1.docker.io", "milvusdb/milvus"),
+        ("swr.cn-north-4.myhuaweicloud.com", "ddn-k8s/docker.io/milvusdb/milvus"),
+    ]
+
+# 测试按吞吐量选择端点
+def test_rank_endpoints_by_throughput():
+    client = DockerRegistryClient(mirrors=parse_mirror_specs([f"registry-1.docker.io={MIRROR}"]))
+    client._stats("registry-1.docker.io").record_throughput(1024, 1.0)
+    client._stats("swr.cn-north-4.myhuaweicloud.com").record_throughput(10 * 1024 * 1024, 1.0)
+
+    ranked = client._rank_endpoints("registry-1.docker.io", "milvusdb/milvus")
+    assert ranked[0][0] == "swr.cn-north-4.myhuaweicloud.com"
+
+# 测试摘要不一致时换下一个端点
+def test_pull_layer_falls_back_on_digest_mismatch():
+    data = os.urandom(50000)
+    digest = "sha256:" + hashlib.sha256(data).hexdigest()
+
+    client = DockerRegistryClient(mirrors=parse_mirror_specs([f"registry-1.docker.io={MIRROR}"]))
+    client.session = FakeSession({
+        "swr.cn-north-4.myhuaweicloud.com": b"corrupted",
+        "registry-1.docker.io": data,
+    })
+    client._stats("registry-1.docker.io").record_throughput(1024, 1.0)
+    client._stats("swr.cn-north-4.myhuaweicloud.com").record_throughput(10 * 1024 * 1024, 1.0)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, "layer.tar.gz")
+        client.pull_layer("milvusdb/milvus:v2.6.9", digest, output_path)
+        with open(output_path, "rb") as f:
+            assert f.read() == data
+
+    assert client._stats("swr.cn-north-4.myhuaweicloud.com").failures == 1
+
+# 测试下载卡顿时中止连接并断点续传
+def test_pull_layer_resumes_after_stall():
+    data = os.urandom(1024 * 1024)
+    digest = "sha256:" + hashlib.sha256(data).hexdigest()
+
+    client = DockerRegistryClient(stall_speed=100 * 1024 * 1024, stall_window=0.05,
+                                  hedge_speed=0, backoff_factor=0)
+    client.session = FakeSession({"registry-1.docker.io": data}, slow_requests=1, delay=0.01)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, "layer.tar.gz")
+        client.pull_layer("nginx:latest", digest, output_path)
+        with open(output_path, "rb") as f:
+            assert f.read() == data
+
+    ranges = [r for _, r in client.session.requested]
+    assert ranges[0] is None
+    assert ranges[1] is not None and ranges[1] != "bytes=0-"
+
+# 测试慢速连接的剩余部分由对冲请求完成
+def test_pull_layer_hedges_slow_download():
+    data = os.urandom(1024 * 1024)
+    digest = "sha256:" + hashlib.sha256(data).hexdigest()
+
+    client = DockerRegistryClient(stall_speed=0, stall_window=0.05,
+                                  hedge_speed=100 * 1024 * 1024, hedge_min_bytes=0)
+    client.session = FakeSession({"registry-1.docker.io": data}, slow_requests=1, delay=0.02)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, "layer.tar.gz")
+        client.pull_layer("nginx:latest", digest, output_path)
+        with open(output_path, "rb") as f:
+            assert f.read() == data
+        assert os.listdir(temp_dir) == ["layer.tar.gz"]
+
+    ranges = [r for _, r in client.session.requested]
+    assert len(ranges) == 2 and ranges[1] is not None
+
+# 测试4xx不在同一端点重试，直接换下一个端点
+def test_pull_layer_does_not_retry_client_errors():
+    data = os.urandom(50000)
+    digest = "sha256:" + hashlib.sha256(data).hexdigest()
+
+    client = DockerRegistryClient(mirrors=parse_mirror_specs([f"registry-1.docker.io={MIRROR}"]), backoff_factor=0)
+    client.session = FakeSession({"registry-1.docker.io": data},
+                                 errors_by_host={"swr.cn-north-4.myhuaweicloud.com": [404] * 10})
+    client._stats("registry-1.docker.io").record_throughput(1024, 1.0)
+    client._stats("swr.cn-north-4.myhuaweicloud.com").record_throughput(10 * 1024 * 1024, 1.0)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, "layer.tar.gz")
+        client.pull_layer("milvusdb/milvus:v2.6.9", digest, output_path)
+        with open(output_path, "rb") as f:
+            assert f.read() == data
+
+    hosts = [url.split("/")[2] for url, _ in client.session.requested]
+    assert hosts == ["swr.cn-north-4.myhuaweicloud.com", "registry-1.docker.io"]
+
+# 测试5xx在同一端点重试，401时重新认证一次
+def test_pull_layer_retries_server_errors_and_reauthenticates():
+    data = os.urandom(50000)
+    digest = "sha256:" + hashlib.sha256(data).hexdigest()
+
+    client = DockerRegistryClient(backoff_factor=0)
+    client.session = FakeSession({"registry-1.docker.io": data},
+                                 errors_by_host={"registry-1.docker.io": [503, 401]})
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, "layer.tar.gz")
+        client.pull_layer("nginx:latest", digest, output_path)
+        with open(output_path, "rb") as f:
+            assert f.read() == data
+
+    assert len(client.session.requested) == 3
+    assert client.session.auth_requests == 2
+
+# 测试重新认证后仍然401时放弃该端点
+def test_pull_layer_gives_up_after_repeated_unauthorized():
+    client = DockerRegistryClient(backoff_factor=0)
+    client.session = FakeSession({}, errors_by_host={"registry-1.docker.io": [401] * 10})
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        try:
+            client.pull_layer("nginx:latest", "sha256:" + "0" * 64, os.path.join(temp_dir, "layer.tar.gz"))
+        except RuntimeError as e:
+            assert "401" in str(e)
+        else:
+            raise AssertionError("Expected RuntimeError")
+
+    assert len(client.session.requested) == 2
+    assert client.session.auth_requests == 2
+
+if __name__ == "__main__":
+    test_mirror_endpoints()
+    test_rank_endpoints_by_throughput()
+    test_pull_layer_falls_back_on_digest_mismatch()
+    test_pull_layer_resumes_after_stall()
+    test_pull_layer_hedges_slow_download()
+    test_pull_layer_does_not_retry_client_errors()
+    test_pull_layer_retries_server_errors_and_reauthenticates()
+    test_pull_layer_gives_up_after_repeated_unauthorized()
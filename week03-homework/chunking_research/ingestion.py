@@ -0,0 +1,103 @@
+import logging
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, TypeVar
+
+from llama_index.core import Settings, SimpleDirectoryReader, StorageContext, VectorStoreIndex
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import BaseNode, MetadataMode
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# 每次送去embedding的节点数
+DEFAULT_EMBED_BATCH_SIZE = 64
+
+
+def iter_input_files(input_dir: str) -> Iterator[str]:
+    """按固定顺序遍历目录下的文件，跳过隐藏文件"""
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for file in sorted(files):
+            if not file.startswith("."):
+                yield os.path.join(root, file)
+
+
+def parse_and_chunk(file_path: str, chunk_size: int, chunk_overlap: int) -> List[BaseNode]:
+    """在子进程中解析单个文件并切分为节点"""
+    documents = SimpleDirectoryReader(input_files=[file_path]).load_data()
+    splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return splitter.get_nodes_from_documents(documents)
+
+
+def _chunks_or_skip(file_path: str, future: "Future[List[BaseNode]]") -> List[BaseNode]:
+    """取出单个文件的切分结果，解析失败时记录日志并跳过该文件"""
+    try:
+        return future.result()
+    except Exception as e:
+        logger.warning(f"Failed to load file {file_path} with error: {e}. Skipping...")
+        return []
+
+
+def iter_chunks(input_dir: str,
+                num_workers: Optional[int] = None,
+                max_pending: Optional[int] = None,
+                chunk_size: Optional[int] = None,
+                chunk_overlap: Optional[int] = None) -> Iterator[BaseNode]:
+    """用进程池并行解析、切分文件，按文件顺序逐个产出节点
+
+    同时在途的文件数不超过max_pending，消费方处理（例如embedding）期间进程池继续解析后续文件。
+    与SimpleDirectoryReader(raise_on_error=False)一样，单个文件解析失败只记录日志并跳过。
+    """
+    num_workers = num_workers or os.cpu_count() or 1
+    max_pending = max_pending or num_workers * 2
+    chunk_size = chunk_size or Settings.chunk_size
+    chunk_overlap = chunk_overlap if chunk_overlap is not None else Settings.chunk_overlap
+
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        pending = deque()
+        for file_path in iter_input_files(input_dir):
+            pending.append((file_path, pool.submit(parse_and_chunk, file_path, chunk_size, chunk_overlap)))
+            if len(pending) >= max_pending:
+                yield from _chunks_or_skip(*pending.popleft())
+
+        while pending:
+            yield from _chunks_or_skip(*pending.popleft())
+
+
+def iter_batches(items: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    """把可迭代对象切成固定大小的批次"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def build_index_streaming(input_dir: str,
+                          storage_context: Optional[StorageContext] = None,
+                          embed_batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+                          num_workers: Optional[int] = None,
+                          max_pending: Optional[int] = None,
+                          chunk_size: Optional[int] = None,
+                          chunk_overlap: Optional[int] = None) -> VectorStoreIndex:
+    """流式构建索引：解析、切分与embedding重叠进行，内存中只保留有限批次的文档"""
+    index = VectorStoreIndex(nodes=[], storage_context=storage_context)
+    embed_model = Settings.embed_model
+
+    chunks = iter_chunks(input_dir, num_workers, max_pending, chunk_size, chunk_overlap)
+    for batch in iter_batches(chunks, embed_batch_size):
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+        embeddings = embed_model.get_text_embedding_batch(texts)
+        for node, embedding in zip(batch, embeddings):
+            node.embedding = embedding
+
+        # 节点已带向量，insert_nodes不会再次调用embedding
+        index.insert_nodes(batch)
+
+    return index
@@ -1,9 +1,14 @@
 import os
+import argparse
+import asyncio
 from dotenv import load_dotenv
 from llama_index.core import Settings
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader
+from llama_index.core import VectorStoreIndex, StorageContext, load_index_from_storage
 from llama_index.llms.openai_like import OpenAILike
 from llama_index.embeddings.dashscope import DashScopeEmbedding, DashScopeTextEmbeddingModels
+from numpy_vector_store import NumpyVectorStore
+from ingestion import build_index_streaming
+from query_cache import SemanticQueryCache, CachedQueryEngine
 
 #增加调试日志
 import logging
@@ -29,12 +34,82 @@ Settings.embed_model = DashScopeEmbedding(
 )
 
 
+# 索引持久化目录，向量单独放在vectors子目录中以memmap方式加载
+STORAGE_DIR = "../storage"
+VECTOR_STORE_DIR = os.path.join(STORAGE_DIR, "vectors")
+QUERY_CACHE_PATH = os.path.join(STORAGE_DIR, "query_cache.json")
+
+
+def load_or_build_index(ivf_lists: int = 0, n_probe: int = 8) -> VectorStoreIndex:
+    """已有持久化索引时直接加载，否则从文档构建并保存
+
+    ivf_lists大于0时，构建后额外建立IVF粗聚类索引，查询只扫描最近的n_probe个簇。
+    """
+    vector_store = NumpyVectorStore.from_persist_dir(VECTOR_STORE_DIR, n_probe=n_probe)
+
+    if os.path.exists(os.path.join(STORAGE_DIR, "docstore.json")):
+        storage_context = StorageContext.from_defaults(persist_dir=STORAGE_DIR, vector_store=vector_store)
+        return load_index_from_storage(storage_context)
+
+    # 流式解析、切分并分批embedding，避免一次性把所有文档读入内存
+    storage_context = StorageContext.from_defaults(vector_store=vector_store)
+    index = build_index_streaming("../data", storage_context)
+    if ivf_lists > 0:
+        vector_store.build_ivf(ivf_lists)
+    storage_context.persist(persist_dir=STORAGE_DIR)
+    return index
+
+
+def positive_int(value: str) -> int:
+    """argparse类型：至少为1的整数"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
 def main():
-    documents = SimpleDirectoryReader("../data").load_data()
-    index = VectorStoreIndex.from_documents(documents)
-    query_engine = index.as_query_engine()
-    response = query_engine.query("怎么休事假？")
-    print(response)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", help="问题文件，每行一个问题，并发批量回答")
+    parser.add_argument("--concurrency", type=positive_int, default=4, help="批量模式下的最大并发查询数")
+    parser.add_argument("--similarity-threshold", type=float, default=0.95, help="语义缓存命中的相似度阈值")
+    parser.add_argument("--cache-ttl", type=float, default=24 * 3600, help="缓存有效期（秒）")
+    parser.add_argument("--cache-capacity", type=int, default=1024, help="缓存最大条目数")
+    parser.add_argument("--ivf-lists", type=int, default=0, help="构建索引时IVF粗聚类的簇数，0表示不建立，查询全量扫描")
+    parser.add_argument("--n-probe", type=positive_int, default=8, help="IVF检索时扫描的簇数")
+    args = parser.parse_args()
+
+    index = load_or_build_index(args.ivf_lists, args.n_probe)
+
+    cache = SemanticQueryCache(
+        Settings.embed_model,
+        similarity_threshold=args.similarity_threshold,
+        ttl=args.cache_ttl,
+        capacity=args.cache_capacity
+    )
+    cache.load(QUERY_CACHE_PATH)
+    query_engine = CachedQueryEngine(index.as_query_engine(), cache)
+
+    try:
+        if args.questions:
+            with open(args.questions, "r", encoding="utf-8") as f:
+                questions = [line.strip() for line in f if line.strip()]
+            results = asyncio.run(query_engine.abatch(questions, args.concurrency))
+            for question, result in zip(questions, results):
+                if isinstance(result, Exception):
+                    print(f"Q: {question}\nError: {type(result).__name__}: {result}\n")
+                else:
+                    print(f"Q: {question}\nA: {result}\n")
+        else:
+            response = query_engine.query("怎么休事假？")
+            print(response)
+    finally:
+        # 出错时也保存已缓存的结果
+        cache.save(QUERY_CACHE_PATH)
+
+    report = query_engine.report()
+    print(f"Queries: {report['queries']}, cache hit rate: {report['cache_hit_rate']:.1%}, "
+          f"p50: {report['p50_latency'] * 1000:.0f}ms, p95: {report['p95_latency'] * 1000:.0f}ms")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
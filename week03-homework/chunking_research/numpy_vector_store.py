@@ -0,0 +1,274 @@
+import os
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+EMBEDDINGS_FNAME = "embeddings.npy"
+NODE_IDS_FNAME = "node_ids.npy"
+REF_DOC_IDS_FNAME = "ref_doc_ids.npy"
+ALIVE_FNAME = "alive.npy"
+CENTROIDS_FNAME = "centroids.npy"
+ASSIGNMENTS_FNAME = "assignments.npy"
+
+# 批量计算点积时每批的行数，避免一次性把整个memmap读入内存
+SCAN_BATCH_ROWS = 65536
+MIN_CAPACITY = 1024
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """按行做L2归一化，点积即余弦相似度"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """基于np.memmap的向量存储
+
+    向量以float32连续存放在磁盘上的.npy文件中，加载时直接内存映射，不需要反序列化JSON；
+    检索时对归一化后的向量做向量化点积求top-k。调用build_ivf后会额外维护一个粗聚类(IVF)索引，
+    查询只扫描最近的n_probe个簇，实现亚线性检索。
+    节点文本仍由docstore保存，这里只保存向量和节点ID。
+    """
+
+    stores_text: bool = False
+    persist_dir: str
+    n_probe: int = 8
+
+    _embeddings: Optional[np.memmap] = PrivateAttr(default=None)
+    _node_ids: List[str] = PrivateAttr(default_factory=list)
+    _ref_doc_ids: List[str] = PrivateAttr(default_factory=list)
+    _alive: np.ndarray = PrivateAttr(default_factory=lambda: np.zeros(0, dtype=bool))
+    _centroids: Optional[np.ndarray] = PrivateAttr(default=None)
+    _assignments: Optional[np.ndarray] = PrivateAttr(default=None)
+
+    def __init__(self, persist_dir: str, n_probe: int = 8, **kwargs: Any) -> None:
+        super().__init__(persist_dir=persist_dir, n_probe=n_probe, **kwargs)
+        os.makedirs(persist_dir, exist_ok=True)
+        self._load()
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, n_probe: int = 8) -> "NumpyVectorStore":
+        """从磁盘目录加载向量存储"""
+        return cls(persist_dir=persist_dir, n_probe=n_probe)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "NumpyVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return self._embeddings
+
+    @property
+    def count(self) -> int:
+        """已写入的向量行数（包含已删除的行）"""
+        return len(self._node_ids)
+
+    def _path(self, fname: str) -> str:
+        return os.path.join(self.persist_dir, fname)
+
+    def _load(self) -> None:
+        """内存映射已有的向量文件"""
+        # 元数据只在persist()时写入，构建中断后会缺失；此时视为空存储，首次add()时覆盖旧文件
+        required = [EMBEDDINGS_FNAME, NODE_IDS_FNAME, REF_DOC_IDS_FNAME, ALIVE_FNAME]
+        if not all(os.path.exists(self._path(fname)) for fname in required):
+            return
+
+        embeddings = np.load(self._path(EMBEDDINGS_FNAME), mmap_mode="r+")
+        node_ids = np.load(self._path(NODE_IDS_FNAME)).tolist()
+        ref_doc_ids = np.load(self._path(REF_DOC_IDS_FNAME)).tolist()
+        alive = np.load(self._path(ALIVE_FNAME))
+        if not (len(ref_doc_ids) == len(node_ids) <= min(len(embeddings), len(alive))):
+            return
+
+        self._embeddings = embeddings
+        self._node_ids = node_ids
+        self._ref_doc_ids = ref_doc_ids
+        self._alive = alive
+
+        centroids_path = self._path(CENTROIDS_FNAME)
+        assignments_path = self._path(ASSIGNMENTS_FNAME)
+        if os.path.exists(centroids_path) and os.path.exists(assignments_path):
+            assignments = np.load(assignments_path)
+            if len(assignments) >= len(node_ids):
+                self._centroids = np.load(centroids_path)
+                self._assignments = assignments
+
+    def _ensure_capacity(self, dim: int, needed: int) -> None:
+        """容量不足时按倍数扩容memmap文件"""
+        if self._embeddings is not None:
+            if self._embeddings.shape[1] != dim:
+                raise ValueError(
+                    f"Embedding dimension mismatch: store has {self._embeddings.shape[1]}, got {dim}"
+                )
+            if needed <= self._embeddings.shape[0]:
+                return
+
+        capacity = self._embeddings.shape[0] if self._embeddings is not None else 0
+        new_capacity = max(needed, capacity * 2, MIN_CAPACITY)
+
+        embeddings_path = self._path(EMBEDDINGS_FNAME)
+        tmp_path = embeddings_path + ".tmp"
+        resized = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(new_capacity, dim))
+        if self._embeddings is not None:
+            resized[: self.count] = self._embeddings[: self.count]
+        resized.flush()
+
+        # 先释放旧的映射再替换文件
+        del resized
+        self._embeddings = None
+        os.replace(tmp_path, embeddings_path)
+        self._embeddings = np.load(embeddings_path, mmap_mode="r+")
+
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[: len(self._alive)] = self._alive[:new_capacity]
+        self._alive = alive
+
+        if self._assignments is not None:
+            assignments = np.full(new_capacity, -1, dtype=np.int32)
+            assignments[: len(self._assignments)] = self._assignments[:new_capacity]
+            self._assignments = assignments
+
+    def add(self, nodes: Sequence[BaseNode], **kwargs: Any) -> List[str]:
+        """写入节点向量"""
+        if not nodes:
+            return []
+
+        vectors = _normalize(np.asarray([node.get_embedding() for node in nodes], dtype=np.float32))
+        start = self.count
+        end = start + len(nodes)
+        self._ensure_capacity(vectors.shape[1], end)
+
+        self._embeddings[start:end] = vectors
+        self._alive[start:end] = True
+        self._node_ids.extend(node.node_id for node in nodes)
+        self._ref_doc_ids.extend(node.ref_doc_id or "" for node in nodes)
+
+        # 已建立IVF索引时，新向量直接分配到最近的簇
+        if self._centroids is not None:
+            self._assignments[start:end] = np.argmax(vectors @ self._centroids.T, axis=1)
+
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """按文档ID删除（仅标记，空间在重建时回收）"""
+        for row, doc_id in enumerate(self._ref_doc_ids):
+            if doc_id == ref_doc_id:
+                self._alive[row] = False
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters: Any = None, **delete_kwargs: Any) -> None:
+        """按节点ID删除"""
+        if filters is not None:
+            raise ValueError("NumpyVectorStore does not support metadata filters")
+        targets = set(node_ids or [])
+        for row, node_id in enumerate(self._node_ids):
+            if node_id in targets:
+                self._alive[row] = False
+
+    def clear(self) -> None:
+        """清空所有向量"""
+        self._alive[:] = False
+
+    def build_ivf(self, n_lists: int, n_iter: int = 10, seed: int = 0) -> None:
+        """用球面k-means构建粗聚类索引"""
+        rows = np.flatnonzero(self._alive[: self.count])
+        if len(rows) == 0:
+            return
+        n_lists = min(n_lists, len(rows))
+
+        rng = np.random.default_rng(seed)
+        centroids = np.array(self._embeddings[np.sort(rng.choice(rows, n_lists, replace=False))])
+
+        assignments = np.full(self._embeddings.shape[0], -1, dtype=np.int32)
+        for _ in range(n_iter):
+            sums = np.zeros_like(centroids)
+            for batch_start in range(0, self.count, SCAN_BATCH_ROWS):
+                batch_end = min(batch_start + SCAN_BATCH_ROWS, self.count)
+                batch = self._embeddings[batch_start:batch_end]
+                labels = np.argmax(batch @ centroids.T, axis=1).astype(np.int32)
+                assignments[batch_start:batch_end] = labels
+                mask = self._alive[batch_start:batch_end]
+                np.add.at(sums, labels[mask], batch[mask])
+
+            # 空簇保留原中心
+            empty = np.linalg.norm(sums, axis=1) == 0
+            sums[empty] = centroids[empty]
+            centroids = _normalize(sums)
+
+        self._centroids = centroids.astype(np.float32)
+        self._assignments = assignments
+
+    def _candidate_rows(self, query_vector: np.ndarray, node_ids: Optional[List[str]]) -> Optional[np.ndarray]:
+        """返回需要扫描的行号，None表示全量扫描"""
+        candidates = None
+        if self._centroids is not None:
+            n_probe = min(self.n_probe, len(self._centroids))
+            probe = np.argpartition(-(self._centroids @ query_vector), n_probe - 1)[:n_probe]
+            candidates = np.flatnonzero(np.isin(self._assignments[: self.count], probe))
+
+        if node_ids is not None:
+            targets = set(node_ids)
+            rows = np.array([row for row, node_id in enumerate(self._node_ids) if node_id in targets], dtype=np.int64)
+            candidates = rows if candidates is None else np.intersect1d(candidates, rows)
+
+        return candidates
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        """向量化top-k检索"""
+        if query.filters is not None:
+            raise ValueError("NumpyVectorStore does not support metadata filters")
+        if self._embeddings is None or query.query_embedding is None:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        query_vector = _normalize(np.asarray(query.query_embedding, dtype=np.float32))
+        candidates = self._candidate_rows(query_vector, query.node_ids)
+
+        if candidates is None:
+            rows = np.arange(self.count)
+            scores = np.empty(self.count, dtype=np.float32)
+            for batch_start in range(0, self.count, SCAN_BATCH_ROWS):
+                batch_end = min(batch_start + SCAN_BATCH_ROWS, self.count)
+                scores[batch_start:batch_end] = self._embeddings[batch_start:batch_end] @ query_vector
+        else:
+            rows = candidates
+            scores = self._embeddings[rows] @ query_vector
+
+        alive = self._alive[rows]
+        rows, scores = rows[alive], scores[alive]
+
+        top_k = min(query.similarity_top_k, len(rows))
+        if top_k == 0:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+
+        return VectorStoreQueryResult(
+            similarities=scores[top].tolist(),
+            ids=[self._node_ids[row] for row in rows[top]],
+        )
+
+    def persist(self, persist_path: Optional[str] = None, fs: Any = None) -> None:
+        """刷新memmap并保存ID等元数据
+
+        向量本身始终写在persist_dir中，StorageContext传入的persist_path会被忽略。
+        """
+        if self._embeddings is None:
+            return
+
+        self._embeddings.flush()
+        np.save(self._path(NODE_IDS_FNAME), np.asarray(self._node_ids, dtype=str))
+        np.save(self._path(REF_DOC_IDS_FNAME), np.asarray(self._ref_doc_ids, dtype=str))
+        np.save(self._path(ALIVE_FNAME), self._alive)
+
+        if self._centroids is not None:
+            np.save(self._path(CENTROIDS_FNAME), self._centroids)
+            np.save(self._path(ASSIGNMENTS_FNAME), self._assignments)
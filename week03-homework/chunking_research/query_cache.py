@@ -0,0 +1,227 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+
+@dataclass
+class CacheEntry:
+    question: str
+    embedding: Optional[np.ndarray]
+    response: str
+    created_at: float
+
+
+def _normalize_question(question: str) -> str:
+    """精确匹配用的键：去掉首尾空白并合并连续空白"""
+    return " ".join(question.split())
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+class SemanticQueryCache:
+    """查询结果缓存：先按问题文本精确匹配，未命中再按embedding余弦相似度匹配
+
+    条目超过ttl秒后失效，数量超过capacity时按LRU淘汰。
+    """
+
+    def __init__(self, embed_model: Optional[BaseEmbedding] = None,
+                 similarity_threshold: float = 0.95,
+                 ttl: Optional[float] = 24 * 3600,
+                 capacity: int = 1024):
+        self.embed_model = embed_model
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.capacity = capacity
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, entry: CacheEntry, now: float) -> bool:
+        return self.ttl is not None and now - entry.created_at > self.ttl
+
+    def _purge_expired(self) -> None:
+        now = time.time()
+        for key in [k for k, e in self._entries.items() if self._expired(e, now)]:
+            del self._entries[key]
+
+    def get_exact(self, question: str) -> Optional[str]:
+        """精确匹配查找"""
+        key = _normalize_question(question)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry, time.time()):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry.response
+
+    def get_similar(self, embedding: List[float]) -> Optional[str]:
+        """相似度匹配查找，返回最相似且超过阈值的条目"""
+        self._purge_expired()
+        keys = [k for k, e in self._entries.items() if e.embedding is not None]
+        if not keys:
+            return None
+
+        matrix = np.stack([self._entries[k].embedding for k in keys])
+        scores = matrix @ _unit(embedding)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+
+        self._entries.move_to_end(keys[best])
+        return self._entries[keys[best]].response
+
+    def put(self, question: str, response: str, embedding: Optional[List[float]] = None) -> None:
+        """写入缓存"""
+        key = _normalize_question(question)
+        self._entries[key] = CacheEntry(
+            question=question,
+            embedding=_unit(embedding) if embedding is not None else None,
+            response=response,
+            created_at=time.time(),
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def save(self, path: str) -> None:
+        """保存到JSON文件，便于跨运行复用"""
+        self._purge_expired()
+        data = [{
+            "question": e.question,
+            "embedding": e.embedding.tolist() if e.embedding is not None else None,
+            "response": e.response,
+            "created_at": e.created_at,
+        } for e in self._entries.values()]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    def load(self, path: str) -> None:
+        """从JSON文件加载"""
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for item in data:
+            embedding = item["embedding"]
+            self._entries[_normalize_question(item["question"])] = CacheEntry(
+                question=item["question"],
+                embedding=np.asarray(embedding, dtype=np.float32) if embedding is not None else None,
+                response=item["response"],
+                created_at=item["created_at"],
+            )
+        self._purge_expired()
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+
+class CachedQueryEngine:
+    """在query engine外包一层缓存，并支持并发批量查询"""
+
+    def __init__(self, query_engine: Any, cache: SemanticQueryCache):
+        self.query_engine = query_engine
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        self.latencies: List[float] = []
+        self._in_flight: Dict[str, "asyncio.Future[str]"] = {}
+
+    def _record(self, start: float, hit: bool) -> None:
+        self.latencies.append(time.perf_counter() - start)
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def query(self, question: str) -> str:
+        """同步查询"""
+        start = time.perf_counter()
+
+        response = self.cache.get_exact(question)
+        embedding = None
+        if response is None and self.cache.embed_model is not None:
+            embedding = self.cache.embed_model.get_query_embedding(question)
+            response = self.cache.get_similar(embedding)
+        if response is not None:
+            self._record(start, hit=True)
+            return response
+
+        response = str(self.query_engine.query(question))
+        self.cache.put(question, response, embedding)
+        self._record(start, hit=False)
+        return response
+
+    async def aquery(self, question: str) -> str:
+        """异步查询，同一批次中相同的问题只会请求一次LLM"""
+        start = time.perf_counter()
+        key = _normalize_question(question)
+
+        response = self.cache.get_exact(question)
+        if response is None and key in self._in_flight:
+            response = await asyncio.shield(self._in_flight[key])
+        if response is not None:
+            self._record(start, hit=True)
+            return response
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            embedding = None
+            if self.cache.embed_model is not None:
+                embedding = await self.cache.embed_model.aget_query_embedding(question)
+                response = self.cache.get_similar(embedding)
+
+            hit = response is not None
+            if not hit:
+                response = str(await self.query_engine.aquery(question))
+                self.cache.put(question, response, embedding)
+            future.set_result(response)
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免"exception was never retrieved"警告
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+        self._record(start, hit=hit)
+        return response
+
+    async def abatch(self, questions: List[str], concurrency: int = 4) -> List[Union[str, Exception]]:
+        """并发回答一批问题，同时进行的查询数不超过concurrency
+
+        单个问题失败不影响其他问题，结果列表中对应位置为该问题抛出的异常。
+        """
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(question: str) -> str:
+            async with semaphore:
+                return await self.aquery(question)
+
+        return await asyncio.gather(*(run(q) for q in questions), return_exceptions=True)
+
+    def report(self) -> Dict[str, float]:
+        """缓存命中率与延迟统计（秒）"""
+        total = self.hits + self.misses
+        latencies = np.asarray(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            "queries": total,
+            "cache_hit_rate": self.hits / total if total else 0.0,
+            "p50_latency": float(np.percentile(latencies, 50)),
+            "p95_latency": float(np.percentile(latencies, 95)),
+        }
@@ -0,0 +1,6 @@
+import importlib.util
+
+# 本项目的依赖（numpy、llama-index）与仓库根目录的docker工具分开安装，
+# 在未安装这些依赖的环境中（例如在仓库根目录运行pytest）跳过本项目的测试
+if importlib.util.find_spec("numpy") is None or importlib.util.find_spec("llama_index") is None:
+    collect_ignore_glob = ["tests/*"]
@@ -0,0 +1,68 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from llama_index.core import Settings
+from llama_index.core.embeddings import MockEmbedding
+
+from chunking_research import ingestion
+
+
+def make_docs(directory, count):
+    """生成count个markdown文件，返回按文件名排序的路径"""
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"doc{i:02d}.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"# Doc {i}\n\nContent of document number {i}.\n")
+        paths.append(path)
+    return paths
+
+
+def test_iter_chunks_order_and_max_pending(tmp_path, monkeypatch):
+    """节点按文件顺序产出，同时在途的文件数不超过max_pending"""
+    submitted = []
+
+    class CountingExecutor(ThreadPoolExecutor):
+        def submit(self, fn, *args, **kwargs):
+            submitted.append(args[0])
+            return super().submit(fn, *args, **kwargs)
+
+    monkeypatch.setattr(ingestion, "ProcessPoolExecutor", CountingExecutor)
+    paths = make_docs(str(tmp_path), 10)
+
+    files = []
+    for node in ingestion.iter_chunks(str(tmp_path), num_workers=2, max_pending=3):
+        file_path = node.metadata["file_path"]
+        if not files or files[-1] != file_path:
+            files.append(file_path)
+            # 产出第k个文件时最多已提交k+max_pending个文件
+            assert len(submitted) <= len(files) + 3
+
+    assert files == paths
+
+
+def test_build_index_streaming(tmp_path, monkeypatch):
+    """流式构建的索引包含所有文件的节点，且每个节点都写入了向量"""
+    monkeypatch.setattr(Settings, "_embed_model", MockEmbedding(embed_dim=8))
+    paths = make_docs(str(tmp_path), 5)
+
+    index = ingestion.build_index_streaming(str(tmp_path), embed_batch_size=2, num_workers=2)
+
+    nodes = list(index.docstore.docs.values())
+    assert [node.metadata["file_path"] for node in nodes] == paths
+    assert len(index.vector_store.data.embedding_dict) == len(nodes)
+
+
+def test_build_index_streaming_skips_bad_file(tmp_path, monkeypatch, caplog):
+    """单个文件解析失败时跳过该文件并记录日志，不中断构建"""
+    monkeypatch.setattr(Settings, "_embed_model", MockEmbedding(embed_dim=8))
+    paths = make_docs(str(tmp_path), 3)
+    # 悬空的符号链接会让SimpleDirectoryReader报错
+    bad_path = os.path.join(tmp_path, "doc01b.md")
+    os.symlink(os.path.join(tmp_path, "missing.md"), bad_path)
+
+    index = ingestion.build_index_streaming(str(tmp_path), embed_batch_size=2, num_workers=2)
+
+    nodes = list(index.docstore.docs.values())
+    assert [node.metadata["file_path"] for node in nodes] == paths
+    assert bad_path in caplog.text
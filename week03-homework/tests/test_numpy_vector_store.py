@@ -0,0 +1,102 @@
+import os
+
+
+import numpy as np
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from chunking_research.numpy_vector_store import MIN_CAPACITY, NumpyVectorStore
+
+
+def make_nodes(vectors, prefix="n", ref_doc_id=None):
+    """为每个向量生成一个带embedding的节点"""
+    relationships = {NodeRelationship.SOURCE: RelatedNodeInfo(node_id=ref_doc_id)} if ref_doc_id else {}
+    return [TextNode(id_=f"{prefix}{i}", text="", embedding=list(map(float, v)), relationships=relationships)
+            for i, v in enumerate(vectors)]
+
+
+def top_ids(store, vector, k=1):
+    result = store.query(VectorStoreQuery(query_embedding=list(map(float, vector)), similarity_top_k=k))
+    return result.ids
+
+
+def test_add_query_persist_reload(tmp_path):
+    """写入、检索、持久化后重新加载"""
+    store = NumpyVectorStore(persist_dir=str(tmp_path))
+    store.add(make_nodes(np.eye(4)))
+
+    assert top_ids(store, [0, 0.9, 0.1, 0], k=2) == ["n1", "n2"]
+    store.persist()
+
+    reloaded = NumpyVectorStore.from_persist_dir(str(tmp_path))
+    assert reloaded.count == 4
+    assert top_ids(reloaded, [0, 0, 0, 1]) == ["n3"]
+
+
+def test_delete_and_delete_nodes(tmp_path):
+    """按文档ID和节点ID删除，删除标记随persist保存"""
+    store = NumpyVectorStore(persist_dir=str(tmp_path))
+    store.add(make_nodes(np.eye(4)[:2], prefix="a", ref_doc_id="doc-a"))
+    store.add(make_nodes(np.eye(4)[2:], prefix="b", ref_doc_id="doc-b"))
+
+    store.delete("doc-a")
+    assert top_ids(store, [1, 0, 1, 0.5], k=4) == ["b0", "b1"]
+
+    store.delete_nodes(["b0"])
+    assert top_ids(store, [0, 0, 1, 0], k=4) == ["b1"]
+
+    store.persist()
+    assert top_ids(NumpyVectorStore.from_persist_dir(str(tmp_path)), [0, 0, 1, 0], k=4) == ["b1"]
+
+
+def test_capacity_growth(tmp_path):
+    """超过初始容量后自动扩容，已有向量不丢失"""
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(MIN_CAPACITY + 100, 8))
+
+    store = NumpyVectorStore(persist_dir=str(tmp_path))
+    store.add(make_nodes(vectors[:MIN_CAPACITY]))
+    assert store.client.shape[0] == MIN_CAPACITY
+
+    store.add(make_nodes(vectors[MIN_CAPACITY:], prefix="m"))
+    assert store.count == MIN_CAPACITY + 100
+    assert store.client.shape[0] >= MIN_CAPACITY + 100
+
+    assert top_ids(store, vectors[0]) == ["n0"]
+    assert top_ids(store, vectors[-1]) == ["m99"]
+
+
+def test_ivf_matches_full_scan(tmp_path):
+    """IVF检索与全量扫描的top-1一致，索引随persist保存，新增向量分配到已有的簇"""
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(8, 16))
+    vectors = np.repeat(centers, 50, axis=0) + rng.normal(scale=0.05, size=(400, 16))
+    queries = centers + rng.normal(scale=0.05, size=centers.shape)
+
+    store = NumpyVectorStore(persist_dir=str(tmp_path), n_probe=2)
+    store.add(make_nodes(vectors))
+    expected = [top_ids(store, q) for q in queries]
+
+    store.build_ivf(n_lists=8)
+    assert [top_ids(store, q) for q in queries] == expected
+
+    store.persist()
+    reloaded = NumpyVectorStore.from_persist_dir(str(tmp_path), n_probe=2)
+    assert [top_ids(reloaded, q) for q in queries] == expected
+    reloaded.add(make_nodes([queries[0] * 10], prefix="new"))
+    assert top_ids(reloaded, queries[0]) == ["new0"]
+
+
+def test_reload_after_interrupted_build(tmp_path):
+    """构建中断（未调用persist）后重新加载视为空存储，并可以重新写入"""
+    store = NumpyVectorStore(persist_dir=str(tmp_path))
+    store.add(make_nodes(np.eye(4)))
+    assert os.path.exists(os.path.join(tmp_path, "embeddings.npy"))
+
+    reloaded = NumpyVectorStore.from_persist_dir(str(tmp_path))
+    assert reloaded.count == 0
+    assert top_ids(reloaded, [1, 0, 0, 0]) == []
+
+    reloaded.add(make_nodes(np.eye(3), prefix="r"))
+    reloaded.persist()
+    assert top_ids(NumpyVectorStore.from_persist_dir(str(tmp_path)), [0, 0, 1]) == ["r2"]
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from llama_index.core.embeddings import MockEmbedding
+
+from chunking_research.query_cache import CachedQueryEngine, SemanticQueryCache
+
+
+class FakeEmbedding(MockEmbedding):
+    """按问题中的关键词生成向量，包含相同关键词的问题互为相似问题"""
+
+    def _get_query_embedding(self, query):
+        return [1.0 if keyword in query else 0.0 for keyword in ("假", "薪", "班")] + [0.01]
+
+    async def _aget_query_embedding(self, query):
+        return self._get_query_embedding(query)
+
+
+class FakeQueryEngine:
+    """记录调用次数的query engine，fail中的问题会抛出异常"""
+
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+
+    def query(self, question):
+        self.calls.append(question)
+        return f"answer to {question}"
+
+    async def aquery(self, question):
+        self.calls.append(question)
+        # 让出事件循环，使并发的相同问题有机会复用在途请求
+        await asyncio.sleep(0.01)
+        if question in self.fail:
+            raise RuntimeError(f"LLM failed on {question}")
+        return f"answer to {question}"
+
+
+def make_engine(fail=(), **kwargs):
+    engine = FakeQueryEngine(fail)
+    cache = SemanticQueryCache(FakeEmbedding(embed_dim=4), **kwargs)
+    return engine, CachedQueryEngine(engine, cache)
+
+
+def test_hit_and_miss():
+    """精确命中、相似命中与未命中"""
+    engine, cached = make_engine()
+
+    assert cached.query("怎么休事假？") == "answer to 怎么休事假？"
+    assert cached.query("  怎么休事假？ ") == "answer to 怎么休事假？"
+    assert cached.query("事假怎么请") == "answer to 怎么休事假？"
+    assert cached.query("工资什么时候发") == "answer to 工资什么时候发"
+
+    assert engine.calls == ["怎么休事假？", "工资什么时候发"]
+    report = cached.report()
+    assert report["queries"] == 4
+    assert report["cache_hit_rate"] == 0.5
+
+
+def test_ttl_expiry():
+    """条目超过ttl后失效"""
+    engine, cached = make_engine(ttl=60)
+
+    cached.query("怎么休事假？")
+    entry = next(iter(cached.cache._entries.values()))
+    entry.created_at -= 61
+
+    cached.query("怎么休事假？")
+    assert engine.calls == ["怎么休事假？", "怎么休事假？"]
+
+
+def test_lru_eviction():
+    """超过容量时淘汰最久未使用的条目"""
+    cache = SemanticQueryCache(capacity=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get_exact("a") == "A"
+
+    cache.put("c", "C")
+    assert len(cache) == 2
+    assert cache.get_exact("b") is None
+    assert cache.get_exact("a") == "A"
+    assert cache.get_exact("c") == "C"
+
+
+def test_abatch_deduplicates_in_flight():
+    """同一批次中相同的问题只请求一次LLM"""
+    engine, cached = make_engine()
+    questions = ["怎么休事假？", "怎么休事假？", "加班费怎么算", " 怎么休事假？"]
+
+    results = asyncio.run(cached.abatch(questions, concurrency=4))
+
+    assert engine.calls.count("怎么休事假？") == 1
+    assert results == ["answer to 怎么休事假？"] * 2 + ["answer to 加班费怎么算", "answer to 怎么休事假？"]
+
+
+def test_abatch_keeps_per_question_errors():
+    """单个问题失败不影响其他问题，结果中对应位置为异常"""
+    engine, cached = make_engine(fail={"加班费怎么算"})
+
+    results = asyncio.run(cached.abatch(["怎么休事假？", "加班费怎么算", "怎么休事假？"], concurrency=2))
+
+    assert results[0] == results[2] == "answer to 怎么休事假？"
+    assert isinstance(results[1], RuntimeError)
+
+
+def test_abatch_rejects_zero_concurrency():
+    """并发数必须至少为1"""
+    _, cached = make_engine()
+    with pytest.raises(ValueError):
+        asyncio.run(cached.abatch(["怎么休事假？"], concurrency=0))